@@ -20,6 +20,7 @@ from altum_v1.utils import (
     initialize_agents, 
     format_structured_task_prompt,
     save_messages_structured,
+    get_last_message_content,
     get_workflow_state,
     update_workflow_state,
     save_workflow_checkpoint,
@@ -29,7 +30,8 @@ from altum_v1.utils import (
     setup_task_environment,
     resume_from_checkpoint,
     get_task_text,
-    get_agent_token
+    get_agent_token,
+    use_fast_event_loop
 )
 
 load_dotenv()
@@ -60,7 +62,6 @@ async def run_understanding_task():
     agent_configs = load_agent_configs()
     available_tools = create_tool_instances()
     which_agents = ['senior_advisor', 'principal_scientist']
-    breakpoint()
     agents = initialize_agents(agent_configs=agent_configs, selected_agents=which_agents, tools=available_tools)
     
     # Get the principal scientist's termination token
@@ -84,7 +85,7 @@ async def run_understanding_task():
     result = await Console(task_group.run_stream(task=formatted_task), output_stats=True)
     
     # Save messages and summary with task description using structured approach
-    await save_messages_structured(stage, subtask, iteration, result.messages, result.messages[-1].dump()["content"], task_text)
+    await save_messages_structured(stage, subtask, iteration, result.messages, get_last_message_content(result), task_text)
     
     # Save checkpoint after completion
     save_workflow_checkpoint(stage, subtask, iteration, "Understanding Complete")
@@ -147,6 +148,8 @@ if __name__ == "__main__":
     parser.add_argument("--force", action="store_true", help="Force restart without prompting")
     args_parsed = parser.parse_args()
     
+    use_fast_event_loop()
+    
     if args_parsed.restart:
         # Restart from beginning
         asyncio.run(main({"clear_state": True}))
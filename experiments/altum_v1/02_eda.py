@@ -9,11 +9,8 @@
 import asyncio
 import sys
 import argparse
-import glob
 import os
-import shutil
 import traceback
-import time
 
 from dotenv import load_dotenv
 import os
@@ -22,19 +19,20 @@ from autogen_agentchat.ui import Console
 from autogen_agentchat.conditions import TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_core.memory import ListMemory, MemoryContent, MemoryMimeType
-from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
 from autogen_agentchat.agents import CodeExecutorAgent
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
-from docker.types import DeviceRequest
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from altum_v1.utils import (
+    cleanup_temp_files_async,
     load_agent_configs, 
     create_tool_instances, 
     initialize_agents, 
     format_structured_task_prompt,
     save_messages_structured,
+    save_society_result,
+    get_last_message_content,
     get_workflow_state,
     update_workflow_state,
     save_workflow_checkpoint,
@@ -45,9 +43,14 @@ from altum_v1.utils import (
     prompt_for_workflow_action,
     setup_task_environment,
     resume_from_checkpoint,
-    save_structured_summary,
     get_task_text,
-    get_agent_token
+    get_agent_token,
+    get_code_executor,
+    flush_text_writes,
+    use_fast_event_loop,
+    prestart_code_executor,
+    run_cached_discussion,
+    memoize_to_disk
 )
 from altum_v1.agents import EngineerSociety
 
@@ -62,33 +65,17 @@ MODEL_TRAINING_STAGE = 4
 # Maximum number of retries for each subtask
 MAX_RETRIES = 3
 
-# Clean up temporary code files
-def cleanup_temp_files(directory="."):
-    """Remove temporary code files created during execution.
-    
-    Args:
-        directory: Directory to clean (defaults to current directory)
-    """
-    # Pattern for temporary code files
-    patterns = ["tmp_code_*", "*.pyc", "__pycache__"]
-    
-    total_removed = 0
-    for pattern in patterns:
-        for file_path in glob.glob(os.path.join(directory, pattern)):
-            try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-                    print(f"Removed: {file_path}")
-                    total_removed += 1
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-                    print(f"Removed directory: {file_path}")
-                    total_removed += 1
-            except Exception as e:
-                print(f"Error removing {file_path}: {e}")
-    
-    print(f"Cleanup complete. Removed {total_removed} temporary files/directories.")
-    return total_removed
+# Code execution timeout (seconds) for the engineer's Docker executor
+CODE_EXECUTION_TIMEOUT = 600
+
+# Appended to the engineer's task on retry attempts
+_TOKEN_OVERFLOW_WARNING = (
+    "\n\n⚠️ CRITICAL WARNING: Previous attempt failed due to token overflow ⚠️"
+    "\n- Be EXTREMELY careful with output sizes"
+    "\n- NEVER print large arrays or full dataframes"
+    "\n- Use .head(), .describe(), and sampling aggressively"
+    "\n- Consider saving outputs to files instead of printing"
+)
 
 async def run_subtask_1(task_env=None):
     """Run the first subtask: Team discussion to create EDA specification."""
@@ -127,13 +114,18 @@ async def run_subtask_1(task_env=None):
     # Format the task with previous context
     formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
     
-    result = await Console(task_group.run_stream(task=formatted_task), output_stats=True)
+    result = await run_cached_discussion(
+        stage, subtask, formatted_task,
+        lambda: Console(task_group.run_stream(task=formatted_task), output_stats=True),
+        task_env
+    )
     
     # Save messages and summary with task description using structured approach
-    await save_messages_structured(stage, subtask, iteration, result.messages, result.messages[-1].dump()["content"], task_text)
+    await save_messages_structured(stage, subtask, iteration, result.messages, get_last_message_content(result), task_text)
     
     return result, task_env
 
+@memoize_to_disk(EDA_STAGE, 2)
 async def run_subtask_2(iteration=1, task_env=None, retry_count=0):
     """Run the second subtask: Engineer implementing the EDA specification.
     
@@ -156,146 +148,117 @@ async def run_subtask_2(iteration=1, task_env=None, retry_count=0):
         is_restart = iteration == 1
         task_env = setup_task_environment(stage, subtask, is_restart=is_restart)
     
-    try:
-        # Clean up any temp files from previous runs
-        if retry_count > 0:
-            print(f"Retry attempt {retry_count} of {MAX_RETRIES}...")
-            cleanup_temp_files()
-            # Short pause to ensure cleanup is complete
-            time.sleep(1)
-        
-        agent_configs = load_agent_configs()
-        available_tools = create_tool_instances()
-        
-        # Initialize engineer team
-        engineer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['engineer'], tools=available_tools)['engineer']
-        engineer_termination_token = get_agent_token(agent_configs, "engineer")
-        # Add code executor to the engineer team
-        code_executor = DockerCommandLineCodeExecutor(
-            image='agenv:latest',
-            work_dir=task_env["workdir"],  # Use main working directory for Docker access
-            timeout=600,
-            device_requests=[DeviceRequest(count=-1, capabilities=[["gpu"]])]
-        )
-        await code_executor.start()
-        code_executor_agent = CodeExecutorAgent('code_executor', code_executor=code_executor)
-        engineer_team = RoundRobinGroupChat(
-            participants=[engineer_agent, code_executor_agent],
-            termination_condition=TextMentionTermination(engineer_termination_token),
-            max_turns=50
-        )
-        
-        # Initialize critic team
-        critic_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['data_science_critic'], tools=available_tools)['data_science_critic']
-        critic_termination_token = get_agent_token(agent_configs, "data_science_critic")
-        critic_team = RoundRobinGroupChat(
-            participants=[critic_agent],
-            termination_condition=TextMentionTermination(critic_termination_token)
-        )
-        
-        # Initialize summarizer agent
-        summarizer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['summarizer'], tools=available_tools)['summarizer']
-        
-        # Choose the appropriate task text based on iteration
-        if iteration == 1:
-            task_text = get_task_text('eda', 'subtask_2')
-        else:
-            # Format the revision text with the current iteration number
-            task_text = get_task_text('eda', 'subtask_2_revision', iteration=iteration)
-        
-        # Append directory information to the task text
-        task_text += f"\n\nIMPORTANT FILE ORGANIZATION INSTRUCTIONS:"
-        task_text += f"\n- Your code runs in the main project directory where data files are located"
-        task_text += f"\n- SAVE ALL OUTPUT FILES to the '{task_env['output_dir']}' directory"
-        task_text += f"\n- This includes plots, intermediate data files, and any other outputs"
-        task_text += f"\n- Example: `plt.savefig('{task_env['output_dir']}/my_plot.png')`"
-        
-        # Add information about data file locations
-        data_files_text = "\n\nDATA FILE INFORMATION:"
-        for filename, file_info in task_env['data_files'].items():
-            if file_info["location"] == "current_dir":
-                data_files_text += f"\n- File '{filename}' is in the current working directory"
+    # Retry in a loop rather than recursively so failed attempts don't pile up stack frames
+    for retry_count in range(retry_count, MAX_RETRIES):
+        try:
+            # Clean up any temp files from previous runs
+            if retry_count > 0:
+                print(f"Retry attempt {retry_count} of {MAX_RETRIES}...")
+                await cleanup_temp_files_async()
+            
+            agent_configs = load_agent_configs()
+            available_tools = create_tool_instances()
+            
+            # Initialize engineer team
+            engineer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['engineer'], tools=available_tools)['engineer']
+            engineer_termination_token = get_agent_token(agent_configs, "engineer")
+            # Add code executor to the engineer team
+            code_executor = await get_code_executor(task_env["workdir"], timeout=CODE_EXECUTION_TIMEOUT)
+            code_executor_agent = CodeExecutorAgent('code_executor', code_executor=code_executor)
+            engineer_team = RoundRobinGroupChat(
+                participants=[engineer_agent, code_executor_agent],
+                termination_condition=TextMentionTermination(engineer_termination_token),
+                max_turns=50
+            )
+            
+            # Initialize critic team
+            critic_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['data_science_critic'], tools=available_tools)['data_science_critic']
+            critic_termination_token = get_agent_token(agent_configs, "data_science_critic")
+            critic_team = RoundRobinGroupChat(
+                participants=[critic_agent],
+                termination_condition=TextMentionTermination(critic_termination_token)
+            )
+            
+            # Initialize summarizer agent
+            summarizer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['summarizer'], tools=available_tools)['summarizer']
+            
+            # Choose the appropriate task text based on iteration
+            if iteration == 1:
+                task_text = get_task_text('eda', 'subtask_2')
             else:
-                data_files_text += f"\n- File '{filename}' status: {file_info['status']}"
-        
-        # Add token management warnings for retry attempts
-        if retry_count > 0:
-            data_files_text += f"\n\n⚠️ CRITICAL WARNING: Previous attempt failed due to token overflow ⚠️"
-            data_files_text += f"\n- Be EXTREMELY careful with output sizes"
-            data_files_text += f"\n- NEVER print large arrays or full dataframes"
-            data_files_text += f"\n- Use .head(), .describe(), and sampling aggressively"
-            data_files_text += f"\n- Consider saving outputs to files instead of printing"
-        
-        task_text += data_files_text
-        
-        # Format the task with previous context, including the current iteration
-        formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
-        
-        # Create the task message
-        task_message = TextMessage(
-            content=formatted_task,
-            source="User"
-        )
-        
-        # Create the EngineerSociety that manages the interaction between teams
-        engineer_society = EngineerSociety(
-            name="eda_society",
-            engineer_team=engineer_team,
-            critic_team=critic_team,
-            critic_approve_token=get_agent_token(agent_configs, "data_science_critic", "approval_token"),
-            engineer_terminate_token=get_agent_token(agent_configs, "engineer"),
-            critic_terminate_token=get_agent_token(agent_configs, "data_science_critic"),
-            critic_revise_token=get_agent_token(agent_configs, "data_science_critic", "revision_token"),
-            summarizer_agent=summarizer_agent,
-            original_task=task_text,
-            output_dir=task_env['output_dir']
-        )
-        
-        # Run the engineer society with the formatted task
-        print(f"Starting EngineerSociety execution for EDA (iteration {iteration})...")
-        result = await engineer_society.on_messages([task_message], CancellationToken())
-        
-        # Extract messages for saving
-        engineer_messages = [task_message]  # Start with the task message
-        if result.inner_messages:
-            engineer_messages.extend(result.inner_messages)
-        if result.chat_message:
-            engineer_messages.append(result.chat_message)
-        
-        # Get the content of the result for the summary
-        summary_content = result.chat_message.content if result.chat_message else "No result"
-        
-        # Save messages and summary with task description
-        await save_messages_structured(stage, subtask, iteration, engineer_messages, 
-                                     summary_content, task_text)
-        
-        # Clean up temp files after successful completion
-        cleanup_temp_files()
-        
-        # Save the summarized report for future reference
-        if result.chat_message and isinstance(result.chat_message, TextMessage):
-            summary_file_path = os.path.join(task_env['output_dir'], f"implementation_summary_iteration_{iteration}.txt")
-            with open(summary_file_path, "w") as f:
-                f.write(result.chat_message.content)
-            print(f"Saved implementation summary to {summary_file_path}")
+                # Format the revision text with the current iteration number
+                task_text = get_task_text('eda', 'subtask_2_revision', iteration=iteration)
             
-            # Also save the implementation summary to the structured summaries
-            await save_structured_summary(stage, subtask, iteration, result.chat_message.content, task_text)
-        
-        return result
-        
-    except Exception as e:
-        print(f"Error in subtask 2 (iteration {iteration}, attempt {retry_count+1}):")
-        print(f"Exception: {str(e)}")
-        traceback.print_exc()
-        
-        # If we haven't exhausted retries, try again
-        if retry_count < MAX_RETRIES - 1:
-            print(f"Retrying subtask 2 (iteration {iteration})...")
-            return await run_subtask_2(iteration, task_env, retry_count + 1)
-        else:
-            print(f"Maximum retries ({MAX_RETRIES}) exceeded for subtask 2. Giving up.")
-            return None
+            # Append directory information to the task text
+            output_dir = task_env['output_dir']
+            task_parts = [
+                task_text,
+                "\n\nIMPORTANT FILE ORGANIZATION INSTRUCTIONS:"
+                "\n- Your code runs in the main project directory where data files are located"
+                f"\n- SAVE ALL OUTPUT FILES to the '{output_dir}' directory"
+                "\n- This includes plots, intermediate data files, and any other outputs"
+                f"\n- Example: `plt.savefig('{output_dir}/my_plot.png')`"
+            ]
+            
+            # Add information about data file locations
+            task_parts.append("\n\nDATA FILE INFORMATION:")
+            for filename, file_info in task_env['data_files'].items():
+                if file_info["location"] == "current_dir":
+                    task_parts.append(f"\n- File '{filename}' is in the current working directory")
+                else:
+                    task_parts.append(f"\n- File '{filename}' status: {file_info['status']}")
+            
+            # Add token management warnings for retry attempts
+            if retry_count > 0:
+                task_parts.append(_TOKEN_OVERFLOW_WARNING)
+            
+            task_text = "".join(task_parts)
+            
+            # Format the task with previous context, including the current iteration
+            formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
+            
+            # Create the task message
+            task_message = TextMessage(
+                content=formatted_task,
+                source="User"
+            )
+            
+            # Create the EngineerSociety that manages the interaction between teams
+            engineer_society = EngineerSociety(
+                name="eda_society",
+                engineer_team=engineer_team,
+                critic_team=critic_team,
+                critic_approve_token=get_agent_token(agent_configs, "data_science_critic", "approval_token"),
+                engineer_terminate_token=get_agent_token(agent_configs, "engineer"),
+                critic_terminate_token=get_agent_token(agent_configs, "data_science_critic"),
+                critic_revise_token=get_agent_token(agent_configs, "data_science_critic", "revision_token"),
+                summarizer_agent=summarizer_agent,
+                original_task=task_text,
+                output_dir=task_env['output_dir']
+            )
+            
+            # Run the engineer society with the formatted task
+            print(f"Starting EngineerSociety execution for EDA (iteration {iteration})...")
+            result = await engineer_society.on_messages([task_message], CancellationToken())
+            
+            await save_society_result(stage, subtask, iteration, task_message, result, task_text,
+                                      os.path.join(task_env['output_dir'], f"implementation_summary_iteration_{iteration}.txt"))
+            
+            return result
+            
+        except Exception as e:
+            print(f"Error in subtask 2 (iteration {iteration}, attempt {retry_count+1}):")
+            print(f"Exception: {str(e)}")
+            traceback.print_exc()
+            # Drop the failed attempt's locals before the next attempt starts
+            traceback.clear_frames(e.__traceback__)
+            
+            # If we haven't exhausted retries, try again
+            if retry_count < MAX_RETRIES - 1:
+                print(f"Retrying subtask 2 (iteration {iteration})...")
+    
+    print(f"Maximum retries ({MAX_RETRIES}) exceeded for subtask 2. Giving up.")
+    return None
 
 async def main(args=None):
     """Run the complete EDA workflow."""
@@ -353,6 +316,7 @@ async def main(args=None):
                             
                             # Mark stage as completed since the EngineerSociety completes when approved
                             print(f"EDA completed after iteration {current_iteration}")
+                            await flush_text_writes()
                             mark_stage_completed(EDA_STAGE)
                             save_workflow_checkpoint(DATA_SPLIT_STAGE, label="Ready for Data Splitting")
                             return
@@ -373,7 +337,7 @@ async def main(args=None):
             await clear_workflow_state(restart_stage)
     
     # Clean up any temporary files from previous runs
-    cleanup_temp_files()
+    await cleanup_temp_files_async()
     
     # If we haven't already created a task environment during resume
     if task_env is None:
@@ -388,11 +352,14 @@ async def main(args=None):
         # Check if understanding stage is completed
         if not is_stage_completed(UNDERSTANDING_STAGE):
             print("Warning: Understanding stage (Stage 1) has not been completed.")
-            proceed = input("Do you want to proceed anyway? (y/n): ").strip().lower()
+            proceed = (await asyncio.to_thread(input, "Do you want to proceed anyway? (y/n): ")).strip().lower()
             if proceed != 'y':
                 print("Exiting. Please run Stage 1 first.")
                 return
     
+        # Boot the code executor container while the subtask 1 discussion runs
+        prestart_code_executor(task_env["workdir"], timeout=CODE_EXECUTION_TIMEOUT)
+        
         # Run subtask 1: Team discussion to create EDA specification
         result1, task_env = await run_subtask_1(task_env)
         if not result1:
@@ -414,11 +381,12 @@ async def main(args=None):
     
     # Mark stage as completed (EngineerSociety handles the approval)
     print(f"EDA completed after iteration {iteration}")
+    await flush_text_writes()
     mark_stage_completed(EDA_STAGE)
     save_workflow_checkpoint(DATA_SPLIT_STAGE, label="Ready for Data Splitting")
     
     # Final cleanup of temporary files
-    cleanup_temp_files()
+    await cleanup_temp_files_async()
 
 if __name__ == "__main__":
     # Add command-line arguments
@@ -432,6 +400,8 @@ if __name__ == "__main__":
         print("Error: Cannot specify both --restart and --resume")
         sys.exit(1)
     
+    use_fast_event_loop()
+    
     if args_parsed.restart:
         # Restart from beginning of EDA
         asyncio.run(clear_workflow_state(EDA_STAGE))
@@ -3,7 +3,6 @@ This module handles the data splitting stage of the workflow.
 It uses agents to collaborate on creating and implementing a data splitting strategy.
 """
 
-import argparse
 import asyncio
 import os
 import sys
@@ -16,9 +15,7 @@ from autogen_agentchat.conditions import TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
-from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
 from autogen_agentchat.agents import CodeExecutorAgent
-from docker.types import DeviceRequest
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from altum_v1.utils import (
@@ -27,20 +24,29 @@ from altum_v1.utils import (
     initialize_agents, 
     format_structured_task_prompt,
     save_messages_structured,
+    save_society_result,
+    get_last_message_content,
     get_workflow_state,
     update_workflow_state,
-    save_workflow_checkpoint,
+    queue_workflow_checkpoint,
+    flush_workflow_checkpoints,
+    CheckpointBatch,
     mark_stage_completed,
     is_stage_completed,
     clear_workflow_state,
     prompt_for_workflow_action,
     setup_task_environment,
     resume_from_checkpoint,
+    resume_stage,
     get_task_text,
-    get_checklist,
-    cleanup_temp_files,
+    cleanup_temp_files_async,
     get_agent_token,
-    save_structured_summary
+    get_code_executor,
+    use_fast_event_loop,
+    memoize_to_disk,
+    flush_text_writes,
+    prestart_code_executor,
+    run_cached_discussion
 )
 from altum_v1.agents import EngineerSociety
 
@@ -55,6 +61,9 @@ MODEL_TRAINING_STAGE = 4
 # Maximum number of retries for each subtask
 MAX_RETRIES = 3
 
+# Code execution timeout (seconds) for the engineer's Docker executor
+CODE_EXECUTION_TIMEOUT = 300
+
 async def run_subtask_1(task_env=None):
     """Run the first subtask: Team discussion to create data splitting specification."""
     # Get the workflow state
@@ -92,14 +101,19 @@ async def run_subtask_1(task_env=None):
     # Format the task with previous context
     formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
     
-    result = await Console(task_group.run_stream(task=formatted_task), output_stats=True)
+    result = await run_cached_discussion(
+        stage, subtask, formatted_task,
+        lambda: Console(task_group.run_stream(task=formatted_task), output_stats=True),
+        task_env
+    )
     
     # Save messages and summary with task description using structured approach
-    await save_messages_structured(stage, subtask, iteration, result.messages, result.messages[-1].dump()["content"], task_text)
+    await save_messages_structured(stage, subtask, iteration, result.messages, get_last_message_content(result), task_text)
     
     return result, task_env
 
 
+@memoize_to_disk(DATA_SPLIT_STAGE, 2)
 async def run_subtask_2(iteration=1, task_env=None, retry_count=0):
     """Run the second subtask: Engineer implementing the data splitting specification.
     
@@ -122,125 +136,129 @@ async def run_subtask_2(iteration=1, task_env=None, retry_count=0):
         is_restart = iteration == 1
         task_env = setup_task_environment(stage, subtask, is_restart=is_restart)
     
-    try:
-        # Clean up any temp files from previous runs
-        if retry_count > 0:
-            print(f"Retry attempt {retry_count} of {MAX_RETRIES}...")
-            cleanup_temp_files()
-        
-        agent_configs = load_agent_configs()
-        available_tools = create_tool_instances()
-        
-        # Initialize engineer team
-        engineer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['engineer'], tools=available_tools)['engineer']
-        breakpoint()
-        engineer_termination_token = get_agent_token(agent_configs, "engineer")
-        # Add code executor to the engineer team
-        code_executor = DockerCommandLineCodeExecutor(
-            image='agenv:latest',
-            work_dir=task_env["workdir"],  # Use main working directory for Docker access
-            timeout=300,
-            device_requests=[DeviceRequest(count=-1, capabilities=[["gpu"]])]
-        )
-        await code_executor.start()
-        code_executor_agent = CodeExecutorAgent('code_executor', code_executor=code_executor)
-        engineer_team = RoundRobinGroupChat(
-            participants=[engineer_agent, code_executor_agent],
-            termination_condition=TextMentionTermination(engineer_termination_token),
-            max_turns=50
-        )
-        
-        # Initialize critic team
-        critic_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['data_science_critic'], tools=available_tools)['data_science_critic']
-        critic_termination_token = get_agent_token(agent_configs, "data_science_critic")
-        critic_team = RoundRobinGroupChat(
-            participants=[critic_agent],
-            termination_condition=TextMentionTermination(critic_termination_token)
-        )
-        
-        # Initialize summarizer agent
-        summarizer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['summarizer'], tools=available_tools)['summarizer']
-        
-        # Choose the appropriate task text based on iteration
-        if iteration == 1:
-            task_text = get_task_text('data_split', 'subtask_2')
-        else:
-            # Format the revision text with the current iteration number
-            task_text = get_task_text('data_split', 'subtask_2_revision', iteration=iteration)
-        
-        # # Add plot quality checklist to the environment
-        # plot_quality_checklist = get_checklist('plot_quality')
-        # with open(os.path.join(task_env['output_dir'], "plot_quality_checklist.txt"), "w") as f:
-        #     f.write(plot_quality_checklist)
-        
-        # Format the task with previous context, including the current iteration
-        formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
-        
-        # Create the task message
-        task_message = TextMessage(
-            content=formatted_task,
-            source="User"
-        )
-        
-        # Create the EngineerSociety that manages the interaction between teams
-        engineer_society = EngineerSociety(
-            name="data_splitting_society",
-            engineer_team=engineer_team,
-            critic_team=critic_team,
-            critic_approve_token=get_agent_token(agent_configs, "data_science_critic", "approval_token"),
-            engineer_terminate_token=get_agent_token(agent_configs, "engineer"),
-            critic_terminate_token=get_agent_token(agent_configs, "data_science_critic"),
-            critic_revise_token=get_agent_token(agent_configs, "data_science_critic", "revision_token"),
-            summarizer_agent=summarizer_agent,
-            original_task=task_text,
-            output_dir=task_env['output_dir']
-        )
-        
-        # Run the engineer society with the formatted task
-        print(f"Starting EngineerSociety execution for data splitting (iteration {iteration})...")
-        result = await engineer_society.on_messages([task_message], CancellationToken())
-        
-        # Extract messages for saving
-        engineer_messages = [task_message]  # Start with the task message
-        if result.inner_messages:
-            engineer_messages.extend(result.inner_messages)
-        if result.chat_message:
-            engineer_messages.append(result.chat_message)
-        
-        # Get the content of the result for the summary
-        summary_content = result.chat_message.content if result.chat_message else "No result"
-        
-        # Save messages and summary with task description
-        await save_messages_structured(stage, subtask, iteration, engineer_messages, 
-                                     summary_content, task_text)
-        
-        # Clean up temp files after successful completion
-        cleanup_temp_files()
-        
-        # Save the summarized report for subtask 3 to use
-        if result.chat_message and isinstance(result.chat_message, TextMessage):
-            summary_file_path = os.path.join(task_env['output_dir'], f"implementation_summary_iteration_{iteration}.txt")
-            with open(summary_file_path, "w") as f:
-                f.write(result.chat_message.content)
-            print(f"Saved implementation summary to {summary_file_path}")
+    # Retry in a loop rather than recursively so failed attempts don't pile up stack frames
+    for retry_count in range(retry_count, MAX_RETRIES):
+        try:
+            # Clean up any temp files from previous runs
+            if retry_count > 0:
+                print(f"Retry attempt {retry_count} of {MAX_RETRIES}...")
+                await cleanup_temp_files_async()
             
-            # Also save the implementation summary to the structured summaries
-            await save_structured_summary(stage, subtask, iteration, result.chat_message.content, task_text)
-        
-        return result
-        
-    except Exception as e:
-        print(f"Error in subtask 2 (iteration {iteration}, attempt {retry_count+1}):")
-        print(f"Exception: {str(e)}")
-        traceback.print_exc()
-        
-        # If we haven't exhausted retries, try again
-        if retry_count < MAX_RETRIES - 1:
-            print(f"Retrying subtask 2 (iteration {iteration})...")
-            return await run_subtask_2(iteration, task_env, retry_count + 1)
-        else:
-            print(f"Maximum retries ({MAX_RETRIES}) exceeded for subtask 2. Giving up.")
-            return None
+            # Load configs and tools while the code executor container starts up
+            agent_configs, available_tools, code_executor = await asyncio.gather(
+                asyncio.to_thread(load_agent_configs),
+                asyncio.to_thread(create_tool_instances),
+                get_code_executor(task_env["workdir"], timeout=CODE_EXECUTION_TIMEOUT)
+            )
+            
+            # Initialize engineer team
+            engineer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['engineer'], tools=available_tools)['engineer']
+            engineer_termination_token = get_agent_token(agent_configs, "engineer")
+            # Add code executor to the engineer team
+            code_executor_agent = CodeExecutorAgent('code_executor', code_executor=code_executor)
+            engineer_team = RoundRobinGroupChat(
+                participants=[engineer_agent, code_executor_agent],
+                termination_condition=TextMentionTermination(engineer_termination_token),
+                max_turns=50
+            )
+            
+            # The critic team and summarizer are only needed once the engineer team has
+            # produced a result, so EngineerSociety builds them on first use
+            def build_critic_team():
+                critic_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['data_science_critic'], tools=available_tools)['data_science_critic']
+                critic_termination_token = get_agent_token(agent_configs, "data_science_critic")
+                return RoundRobinGroupChat(
+                    participants=[critic_agent],
+                    termination_condition=TextMentionTermination(critic_termination_token)
+                )
+            
+            def build_summarizer_agent():
+                return initialize_agents(agent_configs=agent_configs, selected_agents=['summarizer'], tools=available_tools)['summarizer']
+            
+            # Choose the appropriate task text based on iteration
+            if iteration == 1:
+                task_text = get_task_text('data_split', 'subtask_2')
+            else:
+                # Format the revision text with the current iteration number
+                task_text = get_task_text('data_split', 'subtask_2_revision', iteration=iteration)
+            
+            # # Add plot quality checklist to the environment
+            # install_checklist('plot_quality', task_env['output_dir'])
+            
+            # Format the task with previous context, including the current iteration
+            formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
+            
+            # Create the task message
+            task_message = TextMessage(
+                content=formatted_task,
+                source="User"
+            )
+            
+            # Create the EngineerSociety that manages the interaction between teams
+            engineer_society = EngineerSociety(
+                name="data_splitting_society",
+                engineer_team=engineer_team,
+                critic_team=build_critic_team,
+                critic_approve_token=get_agent_token(agent_configs, "data_science_critic", "approval_token"),
+                engineer_terminate_token=get_agent_token(agent_configs, "engineer"),
+                critic_terminate_token=get_agent_token(agent_configs, "data_science_critic"),
+                critic_revise_token=get_agent_token(agent_configs, "data_science_critic", "revision_token"),
+                summarizer_agent=build_summarizer_agent,
+                original_task=task_text,
+                output_dir=task_env['output_dir']
+            )
+            
+            # Run the engineer society with the formatted task
+            print(f"Starting EngineerSociety execution for data splitting (iteration {iteration})...")
+            result = await engineer_society.on_messages([task_message], CancellationToken())
+            
+            await save_society_result(stage, subtask, iteration, task_message, result, task_text,
+                                      os.path.join(task_env['output_dir'], f"implementation_summary_iteration_{iteration}.txt"))
+            
+            return result
+            
+        except Exception as e:
+            print(f"Error in subtask 2 (iteration {iteration}, attempt {retry_count+1}):")
+            print(f"Exception: {str(e)}")
+            traceback.print_exc()
+            # Drop the failed attempt's locals before the next attempt starts
+            traceback.clear_frames(e.__traceback__)
+            
+            # If we haven't exhausted retries, try again
+            if retry_count < MAX_RETRIES - 1:
+                print(f"Retrying subtask 2 (iteration {iteration})...")
+    
+    print(f"Maximum retries ({MAX_RETRIES}) exceeded for subtask 2. Giving up.")
+    return None
+
+async def _resume_subtask_1(current_iteration, task_env):
+    """Resume handler when subtask 1 was the last one recorded."""
+    print("Subtask 1 already completed, skipping...")
+
+async def _resume_subtask_2(current_iteration, task_env):
+    """Resume handler when the workflow stopped in the middle of subtask 2."""
+    # Subtask 2 stays the highest recorded subtask after the stage finishes,
+    # so don't re-run the implementation for a stage that is already done
+    if is_stage_completed(DATA_SPLIT_STAGE):
+        print("Data splitting already completed, skipping subtask 2. Restart the stage to re-run it.")
+        return
+    
+    print(f"Resuming at subtask 2, iteration {current_iteration}...")
+    result2 = await run_subtask_2(current_iteration, task_env)
+    if not result2:
+        print(f"Subtask 2 (iteration {current_iteration}) failed to complete")
+        return
+    
+    # Mark stage as completed since we're skipping subtask 3
+    print(f"Data splitting completed after iteration {current_iteration}")
+    await flush_text_writes()
+    mark_stage_completed(DATA_SPLIT_STAGE)
+
+# Resume handlers indexed by the highest recorded subtask
+_RESUME_DISPATCH = {
+    1: _resume_subtask_1,
+    2: _resume_subtask_2,
+}
 
 async def main(args=None):
     """Run the complete data splitting workflow."""
@@ -270,39 +288,9 @@ async def main(args=None):
             restart_stage = state["current_stage"]
             resume_checkpoint = action["checkpoint_id"]
             
-            # Get the latest subtask and iteration
-            if "iterations" in state:
-                stage_key = f"stage{restart_stage}"
-                if stage_key in state["iterations"]:
-                    subtasks = state["iterations"][stage_key]
-                    if subtasks:
-                        # Find highest subtask and its iteration
-                        highest_subtask = max(int(s.replace("subtask", "")) for s in subtasks.keys())
-                        subtask_key = f"subtask{highest_subtask}"
-                        current_iteration = subtasks.get(subtask_key, 1)
-                        
-                        # Create task environment for resumed task (don't clean directory)
-                        task_env = setup_task_environment(restart_stage, highest_subtask, is_restart=False)
-                        
-                        # Resume from this point
-                        print(f"Resuming at Stage {restart_stage}, Subtask {highest_subtask}, Iteration {current_iteration}")
-                        
-                        if highest_subtask == 1:  # Already completed subtask 1
-                            print("Subtask 1 already completed, skipping...")
-                        elif highest_subtask == 2:  # In the middle of subtask 2
-                            print(f"Resuming at subtask 2, iteration {current_iteration}...")
-                            result2 = await run_subtask_2(current_iteration, task_env)
-                            if not result2:
-                                print(f"Subtask 2 (iteration {current_iteration}) failed to complete")
-                                return
-                            
-                            # Mark stage as completed since we're skipping subtask 3
-                            print(f"Data splitting completed after iteration {current_iteration}")
-                            mark_stage_completed(DATA_SPLIT_STAGE)
-                            return
-                        
-                        # If we get here, we're done with the resume-specific logic
-                        return
+            # Resume from the latest recorded subtask and iteration
+            if await resume_stage(state, _RESUME_DISPATCH):
+                return
         else:  # New workflow
             print("Starting new data splitting workflow...")
             # Set workflow state to DATA_SPLIT stage
@@ -317,7 +305,7 @@ async def main(args=None):
             await clear_workflow_state(restart_stage)
     
     # Clean up any temporary files from previous runs
-    cleanup_temp_files()
+    await cleanup_temp_files_async()
     
     # If we haven't already created a task environment during resume
     if task_env is None:
@@ -325,18 +313,21 @@ async def main(args=None):
         task_env = setup_task_environment(restart_stage, is_restart=is_restart)
     
     # Save a checkpoint at the start
-    save_workflow_checkpoint(DATA_SPLIT_STAGE, label="Data Splitting Start")
+    queue_workflow_checkpoint(DATA_SPLIT_STAGE, label="Data Splitting Start")
     
     # Start the workflow from the appropriate point
     if restart_stage == DATA_SPLIT_STAGE:
         # Check if EDA stage is completed
         if not is_stage_completed(EDA_STAGE):
             print("Warning: EDA stage (Stage 2) has not been completed.")
-            proceed = input("Do you want to proceed anyway? (y/n): ").strip().lower()
+            proceed = (await asyncio.to_thread(input, "Do you want to proceed anyway? (y/n): ")).strip().lower()
             if proceed != 'y':
                 print("Exiting. Please run Stage 2 first.")
                 return
     
+        # Boot the code executor container while the subtask 1 discussion runs
+        prestart_code_executor(task_env["workdir"], timeout=CODE_EXECUTION_TIMEOUT)
+        
         # Run subtask 1: Team discussion to create data splitting specification
         result1, task_env = await run_subtask_1(task_env)
         if not result1:
@@ -344,7 +335,7 @@ async def main(args=None):
             return
         
         # Save checkpoint after subtask 1
-        save_workflow_checkpoint(DATA_SPLIT_STAGE, 1, 1, "Data Splitting Specification Completed")
+        queue_workflow_checkpoint(DATA_SPLIT_STAGE, 1, 1, "Data Splitting Specification Completed", force=True)
     
     # Run subtask 2: Engineer implementing the data splitting
     iteration = 1
@@ -353,18 +344,25 @@ async def main(args=None):
         print("Subtask 2 failed to complete after multiple retries")
         return
     
-    # Save checkpoint after subtask 2
-    save_workflow_checkpoint(DATA_SPLIT_STAGE, 2, iteration, f"Data Splitting Implementation (Iteration {iteration})")
+    # Checkpoints after subtask 2 and the hand-off to model training are written together
+    batch = CheckpointBatch(DATA_SPLIT_STAGE)
+    batch.add(2, iteration, f"Data Splitting Implementation (Iteration {iteration})")
     
     # Mark stage as completed (skipping subtask 3)
     print(f"Data splitting completed after iteration {iteration}")
+    # Queued checkpoints must land before the checkpoints file is modified directly
+    await flush_workflow_checkpoints()
+    await flush_text_writes()
     mark_stage_completed(DATA_SPLIT_STAGE)
-    save_workflow_checkpoint(MODEL_TRAINING_STAGE, label="Ready for Model Training")
+    batch.add(label="Ready for Model Training", stage=MODEL_TRAINING_STAGE)
     
-    # Final cleanup of temporary files
-    cleanup_temp_files()
+    # Write the final checkpoints while cleaning up temporary files
+    await asyncio.gather(batch.flush(), cleanup_temp_files_async())
 
 if __name__ == "__main__":
+    # Only the command-line entry point needs argparse
+    import argparse
+    
     # Add command-line arguments
     parser = argparse.ArgumentParser(description="Run the data splitting workflow with checkpoint/resume options")
     parser.add_argument("--restart", action="store_true", help="Restart from beginning of data splitting stage")
@@ -376,13 +374,12 @@ if __name__ == "__main__":
         print("Error: Cannot specify both --restart and --resume")
         sys.exit(1)
     
+    use_fast_event_loop()
+    
     if args_parsed.restart:
-        # Restart from beginning of data splitting
-        asyncio.run(clear_workflow_state(DATA_SPLIT_STAGE))
+        # Restart from beginning of data splitting; main() clears the stage state
+        # itself, so a single event loop covers the whole run
         asyncio.run(main({"restart_stage": DATA_SPLIT_STAGE, "clear_state": True}))
-    elif args_parsed.resume:
-        # Resume from latest checkpoint (interactive)
-        asyncio.run(main())
     else:
-        # Interactive mode
+        # Resume from latest checkpoint or interactive mode
         asyncio.run(main())
@@ -8,9 +8,6 @@ import asyncio
 import os
 import sys
 import traceback
-import time
-import glob
-import shutil
 
 from dotenv import load_dotenv
 
@@ -19,18 +16,19 @@ from autogen_agentchat.conditions import TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
-from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
 from autogen_agentchat.agents import CodeExecutorAgent
 
-from docker.types import DeviceRequest
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from altum_v1.utils import (
+    cleanup_temp_files_async,
     load_agent_configs, 
     create_tool_instances, 
     initialize_agents, 
     format_structured_task_prompt,
     save_messages_structured,
+    save_society_result,
+    get_last_message_content,
     get_workflow_state,
     update_workflow_state,
     save_workflow_checkpoint,
@@ -42,7 +40,12 @@ from altum_v1.utils import (
     resume_from_checkpoint,
     get_task_text,
     get_agent_token,
-    save_structured_summary
+    get_code_executor,
+    flush_text_writes,
+    use_fast_event_loop,
+    prestart_code_executor,
+    run_cached_discussion,
+    CheckpointBatch
 )
 from altum_v1.agents import EngineerSociety
 
@@ -63,27 +66,8 @@ FINAL_REPORTING_STAGE = 8 # Example: If this is the last iteration cycle
 # Maximum number of retries for each subtask
 MAX_RETRIES = 3
 
-# Clean up temporary code files
-def cleanup_temp_files(directory="."):
-    """Remove temporary code files created during execution."""
-    patterns = ["tmp_code_*", "*.pyc", "__pycache__"]
-    total_removed = 0
-    for pattern in patterns:
-        for file_path in glob.glob(os.path.join(directory, pattern)):
-            try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-                    print(f"Removed: {file_path}")
-                    total_removed += 1
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-                    print(f"Removed directory: {file_path}")
-                    total_removed += 1
-            except Exception as e:
-                print(f"Error removing {file_path}: {e}")
-    if total_removed > 0:
-        print(f"Cleanup complete. Removed {total_removed} temporary files/directories.")
-    return total_removed
+# Code execution timeout (seconds) for the engineer's Docker executor
+CODE_EXECUTION_TIMEOUT = 1800
 
 async def run_subtask_1(task_env=None, iteration=1):
     """Run Subtask 1: Team A reviews results and plans the next iteration."""
@@ -120,9 +104,13 @@ async def run_subtask_1(task_env=None, iteration=1):
     formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
     
     print(f"Starting Review & Iteration Planning (Stage {stage}, Subtask {subtask})...")
-    result = await Console(task_group.run_stream(task=formatted_task), output_stats=True)
+    result = await run_cached_discussion(
+        stage, subtask, formatted_task,
+        lambda: Console(task_group.run_stream(task=formatted_task), output_stats=True),
+        task_env
+    )
     
-    summary_content = result.messages[-1].dump()["content"]
+    summary_content = get_last_message_content(result)
     await save_messages_structured(stage, subtask, iteration, result.messages, summary_content, task_text)
     print(f"\n--- Stage {stage}, Subtask 1 Completed: Specification for next iteration generated ---")
     
@@ -132,7 +120,7 @@ async def run_subtask_2(iteration=1, task_env=None, retry_count=0):
     """Run Subtask 2: Engineer implements the iteration plan and evaluates."""
     stage = REVIEW_ITERATE_STAGE
     subtask = 2
-    timeout = 1800
+    timeout = CODE_EXECUTION_TIMEOUT
     # Iteration number here reflects the *overall* model improvement loop count, passed from main
     update_workflow_state(stage, subtask, iteration) 
     
@@ -144,22 +132,16 @@ async def run_subtask_2(iteration=1, task_env=None, retry_count=0):
     try:
         if retry_count > 0:
             print(f"Retry attempt {retry_count} of {MAX_RETRIES}...")
-            cleanup_temp_files(task_env['output_dir']) 
-            cleanup_temp_files(task_env['workdir']) 
-            time.sleep(1)
+            # The output dir and workdir are cleaned concurrently
+            await asyncio.gather(cleanup_temp_files_async(task_env['output_dir']),
+                                 cleanup_temp_files_async(task_env['workdir']))
         
         agent_configs = load_agent_configs()
         available_tools = create_tool_instances()
         
         engineer_agent = initialize_agents(agent_configs=agent_configs, selected_agents=['engineer'], tools=available_tools)['engineer']
         engineer_termination_token = get_agent_token(agent_configs, "engineer")
-        code_executor = DockerCommandLineCodeExecutor(
-            image='agenv:latest', 
-            work_dir=task_env["workdir"],
-            timeout=timeout,
-            device_requests=[DeviceRequest(count=-1, capabilities=[["gpu"]])]
-        )
-        await code_executor.start()
+        code_executor = await get_code_executor(task_env["workdir"], timeout=timeout)
         code_executor_agent = CodeExecutorAgent('code_executor', code_executor=code_executor, character_limit=10_000)
         engineer_team = RoundRobinGroupChat(
             participants=[engineer_agent, code_executor_agent],
@@ -227,25 +209,10 @@ Use relative paths like `task_3_workdir/train.arrow` when copying or accessing f
         print(f"Starting EngineerSociety execution for Review/Iterate (Stage {stage}, Subtask {subtask}, Iteration {iteration})...")
         result = await engineer_society.on_messages([task_message], CancellationToken())
         
-        engineer_messages = [task_message] 
-        if result.inner_messages:
-            engineer_messages.extend(result.inner_messages)
-        if result.chat_message:
-            engineer_messages.append(result.chat_message)
-        
-        summary_content = result.chat_message.content if result.chat_message else "No final summary provided by EngineerSociety."
-        
-        await save_messages_structured(stage, subtask, iteration, engineer_messages, summary_content, task_text)
-        
-        if result.chat_message and isinstance(result.chat_message, TextMessage):
-            summary_file_path = os.path.join(task_env['output_dir'], f"review_iterate_summary_iteration_{iteration}.txt")
-            with open(summary_file_path, "w") as f:
-                f.write(summary_content)
-            print(f"Saved review/iterate summary to {summary_file_path}")
-            await save_structured_summary(stage, subtask, iteration, summary_content, task_text)
-
-        cleanup_temp_files(task_env['output_dir'])
-        cleanup_temp_files(task_env['workdir'])
+        await save_society_result(stage, subtask, iteration, task_message, result, task_text,
+                                  os.path.join(task_env['output_dir'], f"review_iterate_summary_iteration_{iteration}.txt"),
+                                  cleanup_dirs=(task_env['output_dir'], task_env['workdir']),
+                                  default_summary="No final summary provided by EngineerSociety.")
         
         return result
         
@@ -297,7 +264,7 @@ async def main(args=None):
         if is_restart:
             await clear_workflow_state(restart_stage)
     
-    cleanup_temp_files() 
+    await cleanup_temp_files_async() 
     
     if task_env is None: # If not resuming mid-subtask 2
         task_env = setup_task_environment(restart_stage, 1, is_restart=is_restart, workdir_suffix=f"iteration_{current_model_iteration}") # Env for the whole stage iteration
@@ -318,6 +285,8 @@ async def main(args=None):
     # Run Subtask 1: Planning
     if subtask_to_run == 1:
         print(f"\n--- Running Subtask 1: Plan Iteration {current_model_iteration} ---")
+        # Boot the code executor container while the subtask 1 discussion runs
+        prestart_code_executor(task_env["workdir"], timeout=CODE_EXECUTION_TIMEOUT)
         result1, task_env = await run_subtask_1(task_env, current_model_iteration) # Pass potentially existing task_env
         if not result1:
             print(f"Subtask 1 (Planning Iteration {current_model_iteration}) failed")
@@ -327,6 +296,9 @@ async def main(args=None):
     else:
         print(f"\n--- Skipping Subtask 1: Planning Iteration {current_model_iteration} (already completed or resuming later) ---")
 
+    # Checkpoints after subtask 2 and the hand-off to final reporting are written together
+    batch = CheckpointBatch(REVIEW_ITERATE_STAGE)
+    
     # Run Subtask 2: Execution
     if subtask_to_run == 2:
         print(f"\n--- Running Subtask 2: Execute Iteration {current_model_iteration} ---")
@@ -336,10 +308,11 @@ async def main(args=None):
             return
         # Checkpoint inside run_subtask_2 is more appropriate if it handles iterations internally
         # Here, we save checkpoint after the call completes for this stage iteration
-        save_workflow_checkpoint(REVIEW_ITERATE_STAGE, 2, current_model_iteration, f"Iteration {current_model_iteration} Executed & Evaluated")
+        batch.add(2, current_model_iteration, f"Iteration {current_model_iteration} Executed & Evaluated")
 
     # Mark stage as completed (conceptually, one loop is done)
     print(f"\nReview & Iterate Stage (Iteration {current_model_iteration}) completed.")
+    await flush_text_writes()
     mark_stage_completed(REVIEW_ITERATE_STAGE) # Mark completion for this pass
     
     # Decide if further iterations are needed (this requires external logic or user input)
@@ -347,9 +320,10 @@ async def main(args=None):
     print(f"Outputs are in: {task_env['output_dir']}")
     print("To run another iteration, restart this stage potentially with --clear_state=False and --iteration=<next_iteration_number>")
     print(f"Or proceed to Stage {FINAL_REPORTING_STAGE} if performance is satisfactory.")
-    save_workflow_checkpoint(FINAL_REPORTING_STAGE, label=f"Ready for Final Reporting after Iteration {current_model_iteration}")
+    batch.add(label=f"Ready for Final Reporting after Iteration {current_model_iteration}", stage=FINAL_REPORTING_STAGE)
     
-    cleanup_temp_files() 
+    # Write the final checkpoints while cleaning up temporary files
+    await asyncio.gather(batch.flush(), cleanup_temp_files_async())
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Review & Iterate workflow stage.")
@@ -362,6 +336,8 @@ if __name__ == "__main__":
         print("Error: Cannot specify both --restart and --resume")
         sys.exit(1)
     
+    use_fast_event_loop()
+    
     main_args = {"iteration": args_parsed.iteration}
     if args_parsed.restart:
         main_args["restart_stage"] = REVIEW_ITERATE_STAGE
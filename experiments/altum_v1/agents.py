@@ -1,7 +1,11 @@
 """Custom agent implementations for the Altum v1 workflow."""
 
+from collections import deque
 from typing import Sequence
-import time
+import difflib
+import functools
+import hashlib
+import re
 
 from autogen_agentchat.agents import BaseChatAgent
 from autogen_agentchat.messages import TextMessage, BaseChatMessage
@@ -10,54 +14,191 @@ from autogen_core import CancellationToken
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.ui import Console
 
+# Static instruction texts shared by every EngineerSociety run
+ENGINEERING_HEURISTICS = """ENGINEERING BEST PRACTICES AND TROUBLESHOOTING HEURISTICS:
+
+When implementing your solution, follow these heuristics:
+
+1. DATA UNDERSTANDING:
+   - Always start by exploring and understanding the data structure (column names, data types, missing values)
+   - Print shapes, descriptive statistics, and a few sample rows first
+   - Check for missing data, outliers, or unusual distributions before proceeding
+
+2. TROUBLESHOOTING APPROACH:
+   - When you encounter an error, simplify your code to isolate the problem
+   - Test individual components separately before combining them
+   - Print intermediate results to verify each step works as expected
+   - When debugging, start with the simplest possible version of your code
+
+3. DEVELOPMENT STRATEGY:
+   - Start small with atomic, focused steps that do one thing well
+   - Test each component separately before combining them
+   - Build up complexity incrementally, verifying at each step
+   - Use intermediate data files to break complex processes into manageable stages
+
+4. PERFORMANCE AND QUALITY:
+   - Use sampling for initial testing when working with large datasets
+   - Monitor memory usage and optimize for large data processing
+   - Create clear, informative visualizations with proper labels and titles
+   - Add useful comments explaining WHY, not just WHAT your code does
+
+5. DATA SPLITTING BEST PRACTICES:
+   - Always maintain stratification for important variables when splitting
+   - Check the distributions in your train/test splits to ensure they're representative
+   - Verify there's no data leakage between splits
+   - Use k-fold cross-validation when appropriate to ensure stable results
+
+6. OUTPUT VALIDATION:
+   - Generate summary statistics for each data split and compare them
+   - Create plots showing distributions across splits to visually confirm balance
+   - Use statistical tests to verify similarity between splits
+   - Create clear tables showing counts and percentages of key variables across splits
+
+Remember to check your results at each step and build up complexity gradually.
+"""
+
+TROUBLESHOOTING_REMINDER = """TROUBLESHOOTING REMINDER:
+
+1. When fixing errors or addressing feedback:
+   - Start by understanding exactly what's not working or what feedback needs to be addressed
+   - Break down the problem into smaller parts
+   - Test each part separately to find which component needs fixing
+   - Make one change at a time and test its effect
+
+2. For data splitting issues:
+   - Check the distributions of key variables in each split
+   - Make sure stratification is working correctly
+   - Verify statistical similarity between splits with appropriate tests
+   - Create clear tables showing the counts and percentages for key variables
+
+3. For visualization issues:
+   - Add proper titles, labels, and legends to all plots
+   - Use appropriate color schemes
+   - Include statistical context in the visualization
+   - Save all plots to the correct output directory
+"""
+
+FEEDBACK_ACKNOWLEDGMENT_REMINDER = """CRITICAL REQUIREMENT: Once you receive feedback from the critic, you MUST explicitly acknowledge each point of feedback before implementing changes.
+
+Your response MUST begin with:
+
+"I acknowledge the following feedback points from the data science critic:
+1. [Restate first feedback point from the critic]
+2. [Restate second feedback point from the critic]
+3. [Restate third feedback point from the critic]
+...etc.
+
+My implementation plan to address each point:
+1. [Your plan to address the first point]
+2. [Your plan to address the second point]
+3. [Your plan to address the third point]
+...etc."
+
+DO NOT proceed with code implementation until you have explicitly acknowledged each feedback point from the critic.
+"""
+
+# Number of most recent engineer messages passed on to the critic and summarizer
+NUM_LAST_MESSAGES = 50
+
+# Whitespace-delimited words, matching what str.split() would return
+_WORD_RE = re.compile(r"\S+")
+
+@functools.lru_cache(maxsize=NUM_LAST_MESSAGES)
+def _count_words(content):
+    """Count the words in a message's content.
+    
+    Cached on the content string itself: on_messages estimates overlapping
+    slices of the same messages many times, and str caches its own hash, so
+    repeat lookups are cheap. The cache only holds about one window of recent
+    messages, since it keeps every cached string alive. Editing a message's
+    content produces a new string, so stale counts are never returned. Words
+    are counted by streaming regex matches rather than building a list of
+    every word.
+    """
+    return sum(1 for _ in _WORD_RE.finditer(content))
 
 # Function to estimate the number of tokens in a list of messages (moved from 03_split_data.py)
 def estimate_tokens(messages):
     """Estimate the number of tokens in a list of messages."""
     # Get the total number of words in the messages
-    total_words = sum(len(message.content.split()) for message in messages)
+    total_words = sum(_count_words(message.content) for message in messages)
     # Get the total number of tokens in the messages (approximation)
     total_tokens = total_words * 3
     return total_tokens
 
 
+# How far from the end of a critic review to look for the approve/revise verdict
+CRITIC_VERDICT_TAIL_CHARS = 256
+
+# Upper bound on the messages kept for the summarizer; the oldest are dropped first
+MAX_MESSAGES_TO_SUMMARIZE = 500
+
+# Similarity ratio above which two critic reviews count as the same feedback
+CRITIC_STALL_SIMILARITY = 0.9
+
+def _is_near_duplicate(previous, current, threshold=CRITIC_STALL_SIMILARITY):
+    """Check whether two texts are nearly identical.
+    
+    The cheap upper bounds are checked first so clearly different texts skip
+    the full ratio() computation.
+    """
+    matcher = difflib.SequenceMatcher(None, previous, current)
+    return (matcher.real_quick_ratio() > threshold
+            and matcher.quick_ratio() > threshold
+            and matcher.ratio() > threshold)
+
+
+def _filter_engineer_messages(messages):
+    """Keep the engineer team's text messages, dropping any that mention an error."""
+    return [message for message in messages
+            if isinstance(message, TextMessage) and "error" not in message.content.lower()]
+
+
 class EngineerSociety(BaseChatAgent):
     """A custom agent that manages the interaction between an engineer team and a critic team.
     
     This replaces the previous SocietyOfMindAgent implementation with a more direct approach
     that cycles between the engineer team and the critic team until the critic approves.
+    
+    The critic team and summarizer agent may be passed as zero-argument callables, in which
+    case they are only built once the engineer team has produced a result.
+    
+    Transcripts estimated below summarizer_skip_threshold tokens are returned as-is instead
+    of being sent to the summarizer; pass 0 to always summarize.
     """
     def __init__(self, name: str, engineer_team: RoundRobinGroupChat, critic_team: RoundRobinGroupChat, 
                  critic_approve_token: str, engineer_terminate_token: str, critic_terminate_token: str, 
-                 critic_revise_token: str, summarizer_agent=None, original_task=None, output_dir=".") -> None:
+                 critic_revise_token: str, summarizer_agent=None, original_task=None, output_dir=".",
+                 verbose: bool = True, summarizer_skip_threshold: int = 3000) -> None:
         super().__init__(name, description="An agent that performs implementation with critical feedback.")
         self._engineer_team = engineer_team
-        self._critic_team = critic_team
+        self._critic_team = critic_team  # Team, or a factory that builds it on first use
         self._engineer_terminate_token = engineer_terminate_token
         self._critic_terminate_token = critic_terminate_token
         self._critic_approve_token = critic_approve_token
         self._critic_revise_token = critic_revise_token
-        self._summarizer_agent = summarizer_agent
+        # Find the verdict tokens in one scan and strip all critic tokens in one pass;
+        # longest tokens first so one token can't shadow another it contains
+        self._critic_verdict_re = re.compile("|".join(
+            re.escape(token) for token in sorted({critic_approve_token, critic_revise_token}, key=len, reverse=True)))
+        self._critic_tokens_re = re.compile("|".join(
+            re.escape(token) for token in sorted({critic_terminate_token, critic_revise_token, critic_approve_token}, key=len, reverse=True)))
+        self._summarizer_agent = summarizer_agent  # Agent, or a factory that builds it on first use
         self._original_task = original_task
         self._output_dir = output_dir
-        self.messages_to_summarize = []  # Track all engineer messages
-
-    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
-        """Process messages through the engineer team and critic team with a single round of review.
-        
-        The flow is:
-        1. Engineer team (engineer + executor) writes and runs code
-        2. Critic team reviews the results
-        3. Result is summarized and returned regardless of critic approval
-        """
-        NUM_LAST_MESSAGES = 50
-        original_messages = messages
-        print(f"TOKEN ESTIMATE: engineer society: {estimate_tokens(messages)}")
-        print(f"NUM MESSAGES: {len(messages)}")
-        time.sleep(5)
-        
-        # Add instruction for the engineer to save files in the correct directory
-        engineer_directory_instruction = TextMessage(
+        self._verbose = verbose  # Stream team output and token estimates to the console
+        self._summarizer_skip_threshold = summarizer_skip_threshold
+        self.messages_to_summarize = deque(maxlen=MAX_MESSAGES_TO_SUMMARIZE)  # Track all engineer messages
+        self._summarized_digests = set()  # Content digests of messages_to_summarize, for deduplication
+        self._digest_order = deque()  # The same digests in message order, so evictions can drop theirs
+        self._summarized_count = 0  # Total messages ever added, so evictions still change it
+        self._formatted_history = None  # (added count, formatted text) from the last format
+        self._build_instruction_messages()
+
+    def _build_instruction_messages(self):
+        """Create the fixed instruction messages once, so every round sends identical messages."""
+        # Instruction for the engineer to save files in the correct directory
+        self._engineer_directory_instruction = TextMessage(
             content=f"""IMPORTANT FILE PATH INSTRUCTIONS:
 
 ALL output files (plots, data, etc.) MUST be saved in this exact directory:
@@ -73,67 +214,91 @@ Do NOT save files to the current directory or any other location. Always use '{s
             source="User"
         )
         
-        # Add engineering heuristics and best practices
-        engineering_heuristics = TextMessage(
-            content="""ENGINEERING BEST PRACTICES AND TROUBLESHOOTING HEURISTICS:
-
-When implementing your solution, follow these heuristics:
-
-1. DATA UNDERSTANDING:
-   - Always start by exploring and understanding the data structure (column names, data types, missing values)
-   - Print shapes, descriptive statistics, and a few sample rows first
-   - Check for missing data, outliers, or unusual distributions before proceeding
-
-2. TROUBLESHOOTING APPROACH:
-   - When you encounter an error, simplify your code to isolate the problem
-   - Test individual components separately before combining them
-   - Print intermediate results to verify each step works as expected
-   - When debugging, start with the simplest possible version of your code
-
-3. DEVELOPMENT STRATEGY:
-   - Start small with atomic, focused steps that do one thing well
-   - Test each component separately before combining them
-   - Build up complexity incrementally, verifying at each step
-   - Use intermediate data files to break complex processes into manageable stages
+        # Engineering heuristics and best practices
+        self._engineering_heuristics = TextMessage(
+            content=ENGINEERING_HEURISTICS,
+            source="User"
+        )
+        
+        # Explicit instruction for the critic to use tools
+        self._critic_tool_instruction = TextMessage(
+            content=f"""TOOLS AVAILABLE FOR YOUR REVIEW:
 
-4. PERFORMANCE AND QUALITY:
-   - Use sampling for initial testing when working with large datasets
-   - Monitor memory usage and optimize for large data processing
-   - Create clear, informative visualizations with proper labels and titles
-   - Add useful comments explaining WHY, not just WHAT your code does
+The following tools can help you evaluate the implementation:
+- search_directory("{self._output_dir}", "*.png") to find visualization files
+- analyze_plot("{self._output_dir}/filename.png") to examine any visualizations of interest
+- search_directory("{self._output_dir}", "*") to see all output files
 
-5. DATA SPLITTING BEST PRACTICES:
-   - Always maintain stratification for important variables when splitting
-   - Check the distributions in your train/test splits to ensure they're representative
-   - Verify there's no data leakage between splits
-   - Use k-fold cross-validation when appropriate to ensure stable results
+You can use these tools as needed to support your assessment. Tools are particularly helpful for examining visualizations that seem relevant to your evaluation. In your first review, examining some visualizations is recommended but not mandatory.
 
-6. OUTPUT VALIDATION:
-   - Generate summary statistics for each data split and compare them
-   - Create plots showing distributions across splits to visually confirm balance
-   - Use statistical tests to verify similarity between splits
-   - Create clear tables showing counts and percentages of key variables across splits
+In follow-up reviews, you can focus primarily on whether the engineer addressed your previous feedback and only analyze plots that are new or relevant to the changes.""",
+            source="User"
+        )
+        
+        # Reminders sent with every engineer revision round
+        self._directory_reminder = TextMessage(
+            content=f"""IMPORTANT REMINDER: ALL output files (plots, data, etc.) MUST be saved in:
+{self._output_dir}
 
-Remember to check your results at each step and build up complexity gradually.
-""",
+Examples of correct paths:
+- plt.savefig('{self._output_dir}/histogram.png')
+- df.to_csv('{self._output_dir}/results.csv')""",
             source="User"
         )
         
-        # Add the instruction to the messages
-        engineer_messages_with_path = list(messages) + [engineer_directory_instruction]
+        self._troubleshooting_reminder = TextMessage(
+            content=TROUBLESHOOTING_REMINDER,
+            source="User"
+        )
         
-        # Add heuristics to messages
-        engineer_messages_with_path.append(engineering_heuristics)
+        self._feedback_acknowledgment_reminder = TextMessage(
+            content=FEEDBACK_ACKNOWLEDGMENT_REMINDER,
+            source="User"
+        )
         
-        # Run the engineer team with the given messages
-        result_engineer = await Console(self._engineer_team.run_stream(task=engineer_messages_with_path, cancellation_token=cancellation_token), output_stats=True)
+        self._critic_tool_instruction_tokens = estimate_tokens([self._critic_tool_instruction])
+
+    def _get_critic_team(self):
+        """Return the critic team, building it first if a factory was given."""
+        if callable(self._critic_team):
+            self._critic_team = self._critic_team()
+        return self._critic_team
+    
+    def _get_summarizer_agent(self):
+        """Return the summarizer agent, building it first if a factory was given."""
+        if callable(self._summarizer_agent):
+            self._summarizer_agent = self._summarizer_agent()
+        return self._summarizer_agent
+    
+    def _report_tokens(self, phase, tokens, num_messages):
+        """Print the token estimate and message count for one phase as a single record."""
+        if self._verbose:
+            print(f"TOKEN ESTIMATE: {phase}: {tokens}\nNUM MESSAGES: {num_messages}")
+    
+    async def _run_team(self, team, task, cancellation_token):
+        """Run a team on a task, streaming its output to the console when verbose."""
+        if self._verbose:
+            return await Console(team.run_stream(task=task, cancellation_token=cancellation_token), output_stats=True)
+        return await team.run(task=task, cancellation_token=cancellation_token)
+    
+    async def _run_engineer(self, task, phase, cancellation_token):
+        """Run the engineer team and prepare its messages for the critic and summarizer.
+        
+        Args:
+            task: Messages to run the engineer team on
+            phase: Label for the token estimate report
+            cancellation_token: Token to cancel the run
+            
+        Returns:
+            tuple: (filtered engineer messages, the last NUM_LAST_MESSAGES of them,
+                    or an empty list if the run produced no usable messages)
+        """
+        result_engineer = await self._run_team(self._engineer_team, task, cancellation_token)
+        engineer_messages = _filter_engineer_messages(result_engineer.messages)
+        self._report_tokens(phase, estimate_tokens(engineer_messages), len(engineer_messages))
+        if not engineer_messages:
+            return engineer_messages, []
         
-        engineer_messages = result_engineer.messages
-        engineer_messages = [message for message in engineer_messages if isinstance(message, TextMessage)]
-        engineer_messages = [message for message in engineer_messages if not "error" in message.content.lower()]
-        print(f"TOKEN ESTIMATE: engineer team: {estimate_tokens(engineer_messages)}")
-        print(f"NUM MESSAGES: {len(engineer_messages)}")
-        time.sleep(5)
         # in the last message, remove the engineer_terminate_token
         engineer_messages[-1].content = engineer_messages[-1].content.replace(self._engineer_terminate_token, "")
         if len(engineer_messages) > NUM_LAST_MESSAGES:
@@ -141,58 +306,71 @@ Remember to check your results at each step and build up complexity gradually.
         else:
             last_messages_engineer = engineer_messages
         
-        # Store the last message from the engineer
-        self.messages_to_summarize.extend(last_messages_engineer)
+        # Store the engineer messages for the summary
+        self._add_messages_to_summarize(last_messages_engineer)
+        return engineer_messages, last_messages_engineer
+    
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        """Process messages through the engineer team and critic team with a single round of review.
+        
+        The flow is:
+        1. Engineer team (engineer + executor) writes and runs code
+        2. Critic team reviews the results
+        3. Result is summarized and returned regardless of critic approval
+        """
+        original_messages = messages
+        # Token estimates are kept per message group and added up, rather than
+        # re-estimating the overlapping lists sent to each team
+        original_tokens = estimate_tokens(original_messages)
+        self._report_tokens("engineer society", original_tokens, len(messages))
+        
+        # Add the instruction to the messages
+        engineer_messages_with_path = list(messages) + [self._engineer_directory_instruction]
+        
+        # Add heuristics to messages
+        engineer_messages_with_path.append(self._engineering_heuristics)
+        
+        # Run the engineer team with the given messages
+        engineer_messages, last_messages_engineer = await self._run_engineer(
+            engineer_messages_with_path, "engineer team", cancellation_token)
+        engineer_tokens = estimate_tokens(last_messages_engineer)
         
         last_message_critic = None
+        critic_tokens = 0
         revision_counter = 0
         while True:
-            # Run the critic team with the updated messages
+            # Run the critic team with the updated messages. The parts that are the same
+            # every round (task, tool instructions) come first so backends that cache
+            # prompt prefixes can reuse them; the per-round content follows.
             if last_message_critic is not None:
-                messages_for_critic = original_messages + [last_message_critic] + last_messages_engineer
+                messages_for_critic = original_messages + [self._critic_tool_instruction, last_message_critic] + last_messages_engineer
             else:
-                messages_for_critic = original_messages + last_messages_engineer
-            
-            # Add explicit instruction for critic to use tools
-            tool_instruction_message = TextMessage(
-                content=f"""TOOLS AVAILABLE FOR YOUR REVIEW:
-
-The following tools can help you evaluate the implementation:
-- search_directory("{self._output_dir}", "*.png") to find visualization files
-- analyze_plot("{self._output_dir}/filename.png") to examine any visualizations of interest
-- search_directory("{self._output_dir}", "*") to see all output files
-
-You can use these tools as needed to support your assessment. Tools are particularly helpful for examining visualizations that seem relevant to your evaluation. In your first review, examining some visualizations is recommended but not mandatory.
-
-In follow-up reviews, you can focus primarily on whether the engineer addressed your previous feedback and only analyze plots that are new or relevant to the changes.""",
-                source="User"
-            )
-            messages_for_critic.append(tool_instruction_message)
+                messages_for_critic = original_messages + [self._critic_tool_instruction] + last_messages_engineer
             
-            print(f"TOKEN ESTIMATE: critic team before run {revision_counter}: {estimate_tokens(messages_for_critic)}")
-            print(f"NUM MESSAGES: {len(messages_for_critic)}")
-            time.sleep(5)
-            result_critic = await Console(self._critic_team.run_stream(task=messages_for_critic, cancellation_token=cancellation_token), output_stats=True)
+            critic_input_tokens = original_tokens + critic_tokens + engineer_tokens + self._critic_tool_instruction_tokens
+            self._report_tokens(f"critic team before run {revision_counter}", critic_input_tokens, len(messages_for_critic))
+            result_critic = await self._run_team(self._get_critic_team(), messages_for_critic, cancellation_token)
             critic_messages = result_critic.messages
             
             critic_messages = [message for message in critic_messages if isinstance(message, TextMessage)]
-            print(f"TOKEN ESTIMATE: critic team after run {revision_counter}: {estimate_tokens(critic_messages)}")
-            print(f"NUM MESSAGES: {len(critic_messages)}")
-            time.sleep(5)
+            self._report_tokens(f"critic team after run {revision_counter}", estimate_tokens(critic_messages), len(critic_messages))
 
-            # Store the last message
+            # Store the last message, keeping the previous review to detect a stalled loop
+            previous_critic_content = last_message_critic.content if last_message_critic is not None else None
             last_message_critic = critic_messages[-1]
             
-            # Check for approval BEFORE removing tokens
-            approves = self._critic_approve_token in last_message_critic.content
-            revises = self._critic_revise_token in last_message_critic.content
+            # Check for approval BEFORE removing tokens. The critic is instructed to end its
+            # review with the verdict, so only the tail is searched; this also ignores
+            # tokens that are merely mentioned earlier in the review.
+            verdicts = set(self._critic_verdict_re.findall(last_message_critic.content[-CRITIC_VERDICT_TAIL_CHARS:]))
+            approves = self._critic_approve_token in verdicts
+            revises = self._critic_revise_token in verdicts
             
             # Remove tokens after checking
-            last_message_critic.content = last_message_critic.content.replace(self._critic_terminate_token, "")
-            last_message_critic.content = last_message_critic.content.replace(self._critic_revise_token, "")
-            last_message_critic.content = last_message_critic.content.replace(self._critic_approve_token, "")
+            last_message_critic.content = self._critic_tokens_re.sub("", last_message_critic.content)
+            critic_tokens = estimate_tokens([last_message_critic])
             
-            self.messages_to_summarize.append(last_message_critic)
+            self._add_messages_to_summarize([last_message_critic])
             
             # Check if critic approves the work
             if approves:
@@ -200,139 +378,105 @@ In follow-up reviews, you can focus primarily on whether the engineer addressed
             elif not revises:
                 print(f"Warning: Critic didn't provide a clear approval or revision token")
                 # Continue anyway with revision
+            
+            # Another engineer round won't help if the critic keeps repeating the same review
+            if previous_critic_content is not None and _is_near_duplicate(previous_critic_content, last_message_critic.content):
+                print("Critic feedback is nearly identical to the previous review; stopping revisions")
+                break
                 
             revision_counter += 1
             if revision_counter > 3:
                 break
 
             # Run the engineer team with the updated messages
-            print(f"TOKEN ESTIMATE: engineer team before run {revision_counter}: {estimate_tokens(last_messages_engineer + [last_message_critic])}")
-            print(f"NUM MESSAGES: {len(last_messages_engineer + [last_message_critic])}")
-            time.sleep(5)
-            
-            # Add directory instruction before running engineer again
-            directory_reminder = TextMessage(
-                content=f"""IMPORTANT REMINDER: ALL output files (plots, data, etc.) MUST be saved in:
-{self._output_dir}
-
-Examples of correct paths:
-- plt.savefig('{self._output_dir}/histogram.png')
-- df.to_csv('{self._output_dir}/results.csv')""",
-                source="User"
-            )
-            
-            # Add troubleshooting reminder
-            troubleshooting_reminder = TextMessage(
-                content="""TROUBLESHOOTING REMINDER:
-
-1. When fixing errors or addressing feedback:
-   - Start by understanding exactly what's not working or what feedback needs to be addressed
-   - Break down the problem into smaller parts
-   - Test each part separately to find which component needs fixing
-   - Make one change at a time and test its effect
-
-2. For data splitting issues:
-   - Check the distributions of key variables in each split
-   - Make sure stratification is working correctly
-   - Verify statistical similarity between splits with appropriate tests
-   - Create clear tables showing the counts and percentages for key variables
-
-3. For visualization issues:
-   - Add proper titles, labels, and legends to all plots
-   - Use appropriate color schemes
-   - Include statistical context in the visualization
-   - Save all plots to the correct output directory
-""",
-                source="User"
-            )
-            
-            # Add feedback acknowledgment requirement
-            feedback_acknowledgment_reminder = TextMessage(
-                content="""CRITICAL REQUIREMENT: Once you receive feedback from the critic, you MUST explicitly acknowledge each point of feedback before implementing changes.
-
-Your response MUST begin with:
-
-"I acknowledge the following feedback points from the data science critic:
-1. [Restate first feedback point from the critic]
-2. [Restate second feedback point from the critic]
-3. [Restate third feedback point from the critic]
-...etc.
-
-My implementation plan to address each point:
-1. [Your plan to address the first point]
-2. [Your plan to address the second point]
-3. [Your plan to address the third point]
-...etc."
-
-DO NOT proceed with code implementation until you have explicitly acknowledged each feedback point from the critic.
-""",
-                source="User"
-            )
+            self._report_tokens(f"engineer team before run {revision_counter}", engineer_tokens + critic_tokens, len(last_messages_engineer) + 1)
             
             # Combine the messages with reminders
-            engineer_iteration_messages = original_messages + last_messages_engineer + [last_message_critic, directory_reminder, troubleshooting_reminder, feedback_acknowledgment_reminder]
+            engineer_iteration_messages = original_messages + last_messages_engineer + [last_message_critic, self._directory_reminder, self._troubleshooting_reminder, self._feedback_acknowledgment_reminder]
             
             # Run the engineer team with updated messages
-            result_engineer = await Console(self._engineer_team.run_stream(task=engineer_iteration_messages, cancellation_token=cancellation_token), output_stats=True)
-            engineer_messages = result_engineer.messages
-            
-            engineer_messages = [message for message in engineer_messages if isinstance(message, TextMessage)]
-            engineer_messages = [message for message in engineer_messages if not "error" in message.content.lower()]
-            print(f"TOKEN ESTIMATE: engineer team after run {revision_counter}: {estimate_tokens(engineer_messages)}")
-            print(f"NUM MESSAGES: {len(engineer_messages)}")
-            time.sleep(5)
+            engineer_messages, new_messages_engineer = await self._run_engineer(
+                engineer_iteration_messages, f"engineer team after run {revision_counter}", cancellation_token)
             
             # Remove strict checking for acknowledgment as we've made it a suggestion rather than a requirement
             
-            # Process the engineer messages
-            if len(engineer_messages) > 0:
-                # in the last message, remove the engineer_terminate_token
-                engineer_messages[-1].content = engineer_messages[-1].content.replace(self._engineer_terminate_token, "")
-                if len(engineer_messages) > NUM_LAST_MESSAGES:
-                    last_messages_engineer = engineer_messages[-NUM_LAST_MESSAGES:]
-                else:
-                    last_messages_engineer = engineer_messages
-                self.messages_to_summarize.extend(last_messages_engineer)
+            # Keep the previous engineer messages if this run produced none
+            if new_messages_engineer:
+                last_messages_engineer = new_messages_engineer
+                engineer_tokens = estimate_tokens(last_messages_engineer)
 
         # Generate summary report if a summarizer agent is provided
         if self._summarizer_agent and self._original_task:
-            summary_content = f"""
+            if estimate_tokens(self.messages_to_summarize) < self._summarizer_skip_threshold:
+                # A short transcript is cheaper and more faithful to pass on as-is than to summarize
+                final_result = TextMessage(content=self._format_message_history(), source=self.name)
+            else:
+                summary_content = f"""
 # Original Task:
 {self._original_task}
 
 # Engineer Implementation and Critic Feedback:
 {self._format_message_history()}
 """
-            summary_message = TextMessage(content=summary_content, source="User")
-            print(f"TOKEN ESTIMATE: summarizer agent: {estimate_tokens([summary_message])}")
-            print(f"NUM MESSAGES: {len([summary_message])}")
-            time.sleep(5)
-            summary_result = await self._summarizer_agent.on_messages([summary_message], cancellation_token)
-            final_result = summary_result.chat_message
-            
-            # Add a note about where the original implementation details can be found
-            if isinstance(final_result, TextMessage):
-                final_result.content += "\n\n(Note: This is a summary of the engineer's implementation and the critic's feedback. The full implementation details and code can be found in the previous messages.)"
+                summary_message = TextMessage(content=summary_content, source="User")
+                self._report_tokens("summarizer agent", estimate_tokens([summary_message]), len([summary_message]))
+                summary_result = await self._get_summarizer_agent().on_messages([summary_message], cancellation_token)
+                final_result = summary_result.chat_message
+                
+                # Add a note about where the original implementation details can be found
+                if isinstance(final_result, TextMessage):
+                    final_result.content += "\n\n(Note: This is a summary of the engineer's implementation and the critic's feedback. The full implementation details and code can be found in the previous messages.)"
         else:
             # If no summarizer agent, just return the last engineer message
             final_result = last_messages_engineer[-1] if last_messages_engineer else None
             
         return Response(chat_message=final_result, inner_messages=engineer_messages + critic_messages)
     
+    def _add_messages_to_summarize(self, messages):
+        """Record messages for the summarizer, skipping exact repeats.
+        
+        Each engineer revision run returns the messages it was given as its task
+        (the original task and the previous engineer messages) along with its
+        new ones, so without this the summarizer would see the same content
+        once per revision round.
+        """
+        for message in messages:
+            digest = hashlib.blake2b(f"{message.source}\0{message.content}".encode(), digest_size=8).digest()
+            if digest not in self._summarized_digests:
+                # The deque is about to drop its oldest message; forget that message's digest too
+                if len(self.messages_to_summarize) == self.messages_to_summarize.maxlen:
+                    self._summarized_digests.discard(self._digest_order.popleft())
+                self._summarized_digests.add(digest)
+                self._digest_order.append(digest)
+                self.messages_to_summarize.append(message)
+                self._summarized_count += 1
+    
     def _format_message_history(self):
         """Format the history of engineer and critic messages for summarization."""
-        formatted_history = ""
-        for i, message in enumerate(self.messages_to_summarize):
-            iteration_num = i + 1
-            formatted_history += f"\n\n==== ITERATION {iteration_num} ====\n"
-            formatted_history += f"\nMessage_source: {message.source}\n"
-            formatted_history += message.content
+        # messages_to_summarize only ever gains messages, so the running total identifies its contents
+        count = self._summarized_count
+        if self._formatted_history is not None and self._formatted_history[0] == count:
+            return self._formatted_history[1]
+        
+        parts = [
+            f"\n\n==== ITERATION {iteration_num} ====\n\nMessage_source: {message.source}\n{message.content}"
+            for iteration_num, message in enumerate(self.messages_to_summarize, 1)
+        ]
+        formatted_history = "".join(parts)
+        self._formatted_history = (count, formatted_history)
         return formatted_history
 
     async def on_reset(self, cancellation_token: CancellationToken) -> None:
         # Reset the inner teams
         await self._engineer_team.reset()
-        await self._critic_team.reset()
+        # A critic team that was never built has nothing to reset
+        if not callable(self._critic_team):
+            await self._critic_team.reset()
+        # Start the summarizer history afresh
+        self.messages_to_summarize.clear()
+        self._summarized_digests.clear()
+        self._digest_order.clear()
+        self._formatted_history = None
 
     @property
     def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
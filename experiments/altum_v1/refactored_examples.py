@@ -2,15 +2,12 @@
 
 import os
 import asyncio
-from time import sleep
 
 from autogen_agentchat.conditions import TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.agents import CodeExecutorAgent, AssistantAgent
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
-from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.ui import Console
 
 from altum_v1.utils import (
@@ -19,12 +16,18 @@ from altum_v1.utils import (
     create_tool_instances,
     format_structured_task_prompt,
     save_messages_structured,
+    get_last_message_content,
+    iter_society_messages,
     get_task_text,
     get_system_prompt,
     get_checklist,
+    install_checklist,
     save_workflow_checkpoint,
     mark_stage_completed,
-    update_workflow_state
+    update_workflow_state,
+    get_code_executor,
+    get_model_client,
+    write_text_async
 )
 from altum_v1.agents import EngineerSociety
 
@@ -33,6 +36,15 @@ UNDERSTANDING_STAGE = 1
 EDA_STAGE = 2
 DATA_SPLIT_STAGE = 3
 
+# Appended to the engineer's task on retry attempts
+_TOKEN_OVERFLOW_WARNING = (
+    "\n\n⚠️ CRITICAL WARNING: Previous attempt failed due to token overflow ⚠️"
+    "\n- Be EXTREMELY careful with output sizes"
+    "\n- NEVER print large arrays or full dataframes"
+    "\n- Use .head(), .describe(), and sampling aggressively"
+    "\n- Consider saving outputs to files instead of printing"
+)
+
 # Example of refactored run_understanding_task function from 01_understand_problem.py
 async def run_understanding_task_refactored():
     """Run the task to understand the problem."""
@@ -69,7 +81,7 @@ async def run_understanding_task_refactored():
     result = await Console(task_group.run_stream(task=formatted_task))
     
     # Save messages and summary with task description using structured approach
-    await save_messages_structured(stage, subtask, iteration, result.messages, result.messages[-1].dump()["content"], task_text)
+    await save_messages_structured(stage, subtask, iteration, result.messages, get_last_message_content(result), task_text)
     
     # Save checkpoint after completion
     save_workflow_checkpoint(stage, subtask, iteration, "Understanding Complete")
@@ -90,12 +102,15 @@ async def run_subtask_2_refactored(iteration=1, task_env=None, retry_count=0):
     subtask = 2
     
     try:
+        # Bind the task environment paths once; they are used throughout the prompt below
+        workdir = task_env["workdir"]
+        output_dir = task_env["output_dir"]
+        data_files = task_env["data_files"]
+        
         # Clean up any temp files from previous runs if retrying
         if retry_count > 0:
             print(f"Retry attempt {retry_count} of MAX_RETRIES...")
             # cleanup_temp_files()  # Implement or import this function
-            # Short pause to ensure cleanup is complete
-            sleep(1)
         
         # Initialize agents and tools
         agent_configs = load_agent_configs()
@@ -107,20 +122,16 @@ async def run_subtask_2_refactored(iteration=1, task_env=None, retry_count=0):
             available_tools['search_directory'] = search_directory
         
         # Initialize model client for all agents
-        model_client = OpenAIChatCompletionClient(model="gpt-4o")
+        model_client = get_model_client("gpt-4o")
         
         # 1. Create the engineer agent
         which_agents = ['engineer']
         agents = initialize_agents(agent_configs=agent_configs, selected_agents=which_agents, tools=available_tools)
         engineer_agent = list(agents.values())[0]
         
-        # 2. Create the code executor agent
-        code_executor = DockerCommandLineCodeExecutor(
-            image='agenv:latest',
-            work_dir=task_env["workdir"],
-            timeout=600
-        )
-        await code_executor.start()
+        # 2. Create the code executor agent on the pooled container, so retries and
+        # later iterations don't pay for a fresh container start
+        code_executor = await get_code_executor(workdir, timeout=600)
         code_executor_agent = CodeExecutorAgent('code_executor', code_executor=code_executor)
         
         # 3. Create the critic agent using system prompt from prompts.yaml
@@ -165,49 +176,50 @@ async def run_subtask_2_refactored(iteration=1, task_env=None, retry_count=0):
         else:
             task_text = get_task_text("data_split", "subtask_2_revision", iteration=iteration)
         
-        # Append directory information to the task text
-        task_text += f"\n\nIMPORTANT FILE ORGANIZATION INSTRUCTIONS:"
-        task_text += f"\n- Your code runs in the main project directory where data files are located"
-        task_text += f"\n- SAVE ALL OUTPUT FILES to the '{task_env['output_dir']}' directory"
-        task_text += f"\n- This includes plots, intermediate data files, and any other outputs"
-        task_text += f"\n- Example: plt.savefig('{task_env['output_dir']}/my_plot.png')"
-        task_text += f"\n- The split data files should be saved as train.arrow, val.arrow, test.arrow and train_meta.arrow, val_meta.arrow, test_meta.arrow"
-        
-        # Add data format guardrail
-        task_text += f"\n\n⚠️ CRITICAL DATA FORMAT REQUIREMENT ⚠️"
-        task_text += f"\n- ALWAYS save dataframes ONLY in arrow/feather format using .to_feather() or similar methods"
-        task_text += f"\n- NEVER save data to CSV, TSV, or any other text-based format as these are highly inefficient"
-        task_text += f"\n- Example: df.to_feather('{task_env['output_dir']}/data.arrow')"
-        task_text += f"\n- For any intermediate files, also use arrow/feather format"
-        task_text += f"\n- If you need to export small amounts of summary statistics, use JSON or pickle, but not CSV"
-        
-        # Add information about plot quality requirement
-        task_text += f"\n\nANALYSIS QUALITY VERIFICATION REQUIREMENT:"
-        task_text += f"\n- A plot quality checklist has been saved to '{task_env['output_dir']}/plot_quality_checklist.txt'"
-        task_text += f"\n- For your analysis, you MUST:"
-        task_text += f"\n  1. Provide detailed TABULAR STATISTICS for all key metrics within the text of your analysis report"
-        task_text += f"\n  2. Include cross-tabulations showing counts AND percentages for categorical variables"
-        task_text += f"\n  3. Use statistical tests to verify the representativeness of splits"
-        task_text += f"\n  4. Present tables BEFORE visualizations as your primary evidence"
-        task_text += f"\n  5. Use visualizations to support and enhance the tabular statistics"
+        # Append directory, data format and analysis quality instructions to the task text
+        install_checklist("plot_quality", output_dir)
+        task_parts = [
+            task_text,
+            "\n\nIMPORTANT FILE ORGANIZATION INSTRUCTIONS:"
+            "\n- Your code runs in the main project directory where data files are located"
+            f"\n- SAVE ALL OUTPUT FILES to the '{output_dir}' directory"
+            "\n- This includes plots, intermediate data files, and any other outputs"
+            f"\n- Example: plt.savefig('{output_dir}/my_plot.png')"
+            "\n- The split data files should be saved as train.arrow, val.arrow, test.arrow and train_meta.arrow, val_meta.arrow, test_meta.arrow"
+            
+            # Data format guardrail
+            "\n\n⚠️ CRITICAL DATA FORMAT REQUIREMENT ⚠️"
+            "\n- ALWAYS save dataframes ONLY in arrow/feather format with Zstd compression using pyarrow.feather.write_feather()"
+            "\n- NEVER save data to CSV, TSV, or any other text-based format as these are highly inefficient"
+            f"\n- Example: pyarrow.feather.write_feather(df, '{output_dir}/data.arrow', compression='zstd', compression_level=3)"
+            "\n- Convert string metadata columns (tissue, sex, dataset) with .astype('category') before saving so they are dictionary-encoded"
+            "\n- For any intermediate files, also use arrow/feather format"
+            "\n- If you need to export small amounts of summary statistics, use JSON or pickle, but not CSV"
+            
+            # Plot quality requirement
+            "\n\nANALYSIS QUALITY VERIFICATION REQUIREMENT:"
+            f"\n- A plot quality checklist has been saved to '{output_dir}/plot_quality_checklist.txt'"
+            "\n- For your analysis, you MUST:"
+            "\n  1. Provide detailed TABULAR STATISTICS for all key metrics within the text of your analysis report"
+            "\n  2. Include cross-tabulations showing counts AND percentages for categorical variables"
+            "\n  3. Use statistical tests to verify the representativeness of splits"
+            "\n  4. Present tables BEFORE visualizations as your primary evidence"
+            "\n  5. Use visualizations to support and enhance the tabular statistics"
+        ]
         
         # Add information about data file locations
-        data_files_text = "\n\nDATA FILE INFORMATION:"
-        for filename, file_info in task_env['data_files'].items():
+        task_parts.append("\n\nDATA FILE INFORMATION:")
+        for filename, file_info in data_files.items():
             if file_info["location"] == "current_dir":
-                data_files_text += f"\n- File '{filename}' is in the current working directory"
+                task_parts.append(f"\n- File '{filename}' is in the current working directory")
             else:
-                data_files_text += f"\n- File '{filename}' status: {file_info['status']}"
+                task_parts.append(f"\n- File '{filename}' status: {file_info['status']}")
         
         # Add token management warnings for retry attempts
         if retry_count > 0:
-            data_files_text += f"\n\n⚠️ CRITICAL WARNING: Previous attempt failed due to token overflow ⚠️"
-            data_files_text += f"\n- Be EXTREMELY careful with output sizes"
-            data_files_text += f"\n- NEVER print large arrays or full dataframes"
-            data_files_text += f"\n- Use .head(), .describe(), and sampling aggressively"
-            data_files_text += f"\n- Consider saving outputs to files instead of printing"
+            task_parts.append(_TOKEN_OVERFLOW_WARNING)
             
-        task_text += data_files_text
+        task_text = "".join(task_parts)
         
         # Format the task with previous context
         formatted_task = await format_structured_task_prompt(stage, subtask, task_text, iteration)
@@ -236,11 +248,7 @@ async def run_subtask_2_refactored(iteration=1, task_env=None, retry_count=0):
         result = await engineer_society.on_messages([task_message], CancellationToken())
         
         # Extract messages for saving
-        engineer_messages = [task_message]  # Start with the task message
-        if result.inner_messages:
-            engineer_messages.extend(result.inner_messages)
-        if result.chat_message:
-            engineer_messages.append(result.chat_message)
+        engineer_messages = iter_society_messages(task_message, result)
         
         # Save messages and summary with task description
         await save_messages_structured(stage, subtask, iteration, engineer_messages, 
@@ -249,9 +257,8 @@ async def run_subtask_2_refactored(iteration=1, task_env=None, retry_count=0):
         
         # Save the summarized report for subtask 3 to use
         if result.chat_message and hasattr(result.chat_message, 'content'):
-            summary_file_path = os.path.join(task_env['output_dir'], f"implementation_summary_iteration_{iteration}.txt")
-            with open(summary_file_path, "w") as f:
-                f.write(result.chat_message.content)
+            summary_file_path = os.path.join(output_dir, f"implementation_summary_iteration_{iteration}.txt")
+            await write_text_async(summary_file_path, result.chat_message.content, durable=True)
             print(f"Saved implementation summary to {summary_file_path}")
         
         return result
@@ -0,0 +1,17 @@
+import ast
+import os
+import glob
+
+WORKFLOW_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_no_breakpoint_calls():
+    """Test that no workflow module calls breakpoint(), which would hang unattended runs."""
+    offenders = []
+    for path in sorted(glob.glob(os.path.join(WORKFLOW_DIR, "*.py"))):
+        with open(path, "r") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                    and node.func.id == "breakpoint"):
+                offenders.append(f"{os.path.basename(path)}:{node.lineno}")
+    assert offenders == []
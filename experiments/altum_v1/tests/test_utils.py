@@ -0,0 +1,403 @@
+import os
+import json
+import asyncio
+import shutil
+import tempfile
+import pytest
+
+from utils import (
+    load_agent_configs,
+    load_task_prompts,
+    create_tool_instances,
+    cleanup_temp_files,
+    clean_directory,
+    write_json_atomic,
+    queue_workflow_checkpoint,
+    flush_workflow_checkpoints,
+    queue_text_write,
+    flush_text_writes,
+    get_workflow_checkpoints,
+    CheckpointBatch,
+    memoize_to_disk,
+    setup_task_environment,
+    install_checklist,
+    get_task_text,
+    iter_society_messages
+)
+import utils
+
+class TestUtils:
+    @pytest.fixture(autouse=True)
+    def setup_and_teardown(self):
+        """Create a temporary directory for test files and clean up after tests."""
+        self.temp_dir = tempfile.mkdtemp()
+        yield
+        shutil.rmtree(self.temp_dir)
+
+    def write_agent_config(self, name):
+        """Helper to write a minimal agents.yaml into the temp directory."""
+        config_path = os.path.join(self.temp_dir, 'agents.yaml')
+        with open(config_path, 'w') as f:
+            f.write(f"agents:\n  - name: {name}\n    description: test agent\n")
+        return config_path
+
+    def test_load_agent_configs_is_cached(self):
+        """Test that repeated loads of an unchanged file return the cached configs."""
+        config_path = self.write_agent_config("engineer")
+
+        first = load_agent_configs(config_path)
+        second = load_agent_configs(config_path)
+
+        assert first[0]["name"] == "engineer"
+        assert first is second
+
+    def test_load_agent_configs_reloads_on_change(self):
+        """Test that editing the YAML invalidates the cached configs."""
+        config_path = self.write_agent_config("engineer")
+        first = load_agent_configs(config_path)
+
+        self.write_agent_config("critic")
+        # Bump the mtime explicitly so the test doesn't depend on timestamp resolution
+        stat = os.stat(config_path)
+        os.utime(config_path, (stat.st_atime, stat.st_mtime + 10))
+
+        second = load_agent_configs(config_path)
+        assert first[0]["name"] == "engineer"
+        assert second[0]["name"] == "critic"
+
+    def test_clear_workflow_state_reloads_configs(self, monkeypatch):
+        """Test that restarting a stage drops the cached agent configs."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        config_path = self.write_agent_config("engineer")
+        first = load_agent_configs(config_path)
+
+        asyncio.run(utils.clear_workflow_state(3))
+        assert load_agent_configs(config_path) is not first
+
+    def test_load_task_prompts_is_cached(self):
+        """Test that repeated loads of an unchanged task file return the cached prompts."""
+        config_path = os.path.join(self.temp_dir, 'tasks.yaml')
+        with open(config_path, 'w') as f:
+            f.write("tasks:\n  eda:\n    subtask_1:\n      text: explore\n")
+
+        first = load_task_prompts(config_path)
+        assert first["eda"]["subtask_1"]["text"] == "explore"
+        assert load_task_prompts(config_path) is first
+
+    def test_create_tool_instances_is_shared(self):
+        """Test that tool instances are created once and reused."""
+        assert create_tool_instances() is create_tool_instances()
+
+    def test_get_code_executor_starts_one_container(self, monkeypatch):
+        """Test that concurrent and prestarted requests for the same executor share one container start-up."""
+        started = []
+
+        class FakeExecutor:
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+
+            async def start(self):
+                started.append(self.kwargs["work_dir"])
+                await asyncio.sleep(0.01)
+
+            async def stop(self):
+                pass
+
+        monkeypatch.setattr(utils, 'DockerCommandLineCodeExecutor', FakeExecutor)
+        monkeypatch.setattr(utils, '_executor_pool', {})
+
+        async def run():
+            executors = await asyncio.gather(
+                utils.get_code_executor(self.temp_dir),
+                utils.get_code_executor(self.temp_dir)
+            )
+            await utils.stop_code_executors()
+            return executors
+
+        first, second = asyncio.run(run())
+        assert first is second
+        assert started == [self.temp_dir]
+
+        async def run_prestarted():
+            utils.prestart_code_executor(self.temp_dir)
+            await asyncio.sleep(0)
+            executor = await utils.get_code_executor(self.temp_dir)
+            await utils.stop_code_executors()
+            return executor
+
+        assert isinstance(asyncio.run(run_prestarted()), FakeExecutor)
+        assert started == [self.temp_dir, self.temp_dir]
+
+    def test_write_json_atomic(self):
+        """Test that write_json_atomic writes the payload and leaves no temp file behind."""
+        path = os.path.join(self.temp_dir, 'task_info.json')
+        write_json_atomic(path, {"stage": 3, "subtask": 2})
+        write_json_atomic(path, {"stage": 3, "subtask": 3})
+
+        with open(path, 'r') as f:
+            assert json.load(f) == {"stage": 3, "subtask": 3}
+        assert os.listdir(self.temp_dir) == ['task_info.json']
+
+    def test_cleanup_temp_files(self):
+        """Test that cleanup removes temporary code files and leaves other files alone."""
+        open(os.path.join(self.temp_dir, 'tmp_code_abc.py'), 'w').close()
+        open(os.path.join(self.temp_dir, 'keep.arrow'), 'w').close()
+        os.makedirs(os.path.join(self.temp_dir, '__pycache__'))
+
+        assert cleanup_temp_files(self.temp_dir) == 2
+        assert os.listdir(self.temp_dir) == ['keep.arrow']
+
+    def test_cleanup_temp_files_matches_whole_names(self):
+        """Test that names merely containing a temp-file pattern are kept."""
+        for name in ('notes.pyc.txt', 'my_tmp_code_1.py', '__pycache__.bak'):
+            open(os.path.join(self.temp_dir, name), 'w').close()
+
+        assert cleanup_temp_files(self.temp_dir) == 0
+        assert len(os.listdir(self.temp_dir)) == 3
+
+    def test_cleanup_temp_files_nothing_to_remove(self):
+        """Test that cleanup returns early when no temporary files exist."""
+        open(os.path.join(self.temp_dir, 'keep.arrow'), 'w').close()
+
+        assert cleanup_temp_files(self.temp_dir) == 0
+        assert os.listdir(self.temp_dir) == ['keep.arrow']
+
+    def test_queued_checkpoints_are_written(self, monkeypatch):
+        """Test that queued checkpoints all reach the checkpoints file after a flush."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+
+        async def run():
+            first = queue_workflow_checkpoint(3, 1, 1)
+            second = queue_workflow_checkpoint(4)
+            await flush_workflow_checkpoints()
+            return first, second
+
+        first, second = asyncio.run(run())
+        checkpoints = get_workflow_checkpoints()
+        assert set(checkpoints["checkpoints"]) == {first, second}
+        assert checkpoints["stages_completed"] == [4]
+
+    def test_queued_text_writes_land_in_order(self):
+        """Test that queued text files are written in the background and all land after a flush."""
+        path = os.path.join(self.temp_dir, 'implementation_summary_iteration_1.txt')
+
+        async def run():
+            queue_text_write(path, "first draft")
+            queue_text_write(path, "final summary", durable=True)
+            await flush_text_writes()
+
+        asyncio.run(run())
+        with open(path) as f:
+            assert f.read() == "final summary"
+
+    def test_checkpoint_batch_writes_once(self, monkeypatch):
+        """Test that a checkpoint batch persists all entries in a single write."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        writes = []
+        original = utils._write_checkpoints
+        monkeypatch.setattr(utils, '_write_checkpoints', lambda entries: writes.append(entries) or original(entries))
+
+        batch = CheckpointBatch(3)
+        first = batch.add(2, 1)
+        second = batch.add(label="Next stage", stage=4)
+        asyncio.run(batch.flush())
+        asyncio.run(batch.flush())
+
+        assert len(writes) == 1
+        assert set(get_workflow_checkpoints()["checkpoints"]) == {first, second}
+
+    def test_checkpoint_min_interval_coalesces_writes(self, monkeypatch):
+        """Test that checkpoints queued within the minimum interval share one write."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        monkeypatch.setattr(utils, 'CHECKPOINT_MIN_INTERVAL_S', 0.2)
+        writes = []
+        original = utils._write_checkpoints
+        monkeypatch.setattr(utils, '_write_checkpoints', lambda entries: writes.append(entries) or original(entries))
+
+        async def run():
+            utils._last_ckpt_ts = utils.time.monotonic()
+            queue_workflow_checkpoint(3, 2, 1)
+            queue_workflow_checkpoint(3, 2, 2)
+            await asyncio.sleep(0.5)
+
+        asyncio.run(run())
+        assert len(writes) == 1
+        assert len(writes[0]) == 2
+
+    def test_memoize_to_disk_reuses_result_on_resume(self, monkeypatch):
+        """Test that a memoized subtask runs once and is served from disk when resuming."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        calls = []
+
+        @memoize_to_disk(3, 2)
+        async def run_subtask(iteration=1, task_env=None):
+            calls.append(iteration)
+            return {"iteration": iteration}
+
+        task_env = {"workdir": self.temp_dir, "output_dir": self.temp_dir,
+                    "data_files": {}, "info": {"is_restart": False}}
+        assert asyncio.run(run_subtask(1, task_env)) == {"iteration": 1}
+        assert asyncio.run(run_subtask(1, task_env)) == {"iteration": 1}
+        assert calls == [1]
+
+        task_env["info"]["is_restart"] = True
+        asyncio.run(run_subtask(1, task_env))
+        assert calls == [1, 1]
+
+    def test_memoize_to_disk_tracks_upstream_outputs(self, monkeypatch):
+        """Test that rewriting an upstream stage's outputs invalidates the cached result."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        monkeypatch.chdir(self.temp_dir)
+        os.makedirs('task_3_workdir')
+        with open(os.path.join('task_3_workdir', 'train.arrow'), 'w') as f:
+            f.write("split v1")
+        calls = []
+
+        @memoize_to_disk(4, 2, upstream_stages=(3,))
+        async def run_subtask(iteration=1, task_env=None):
+            calls.append(iteration)
+            return {"iteration": iteration}
+
+        task_env = {"workdir": self.temp_dir, "output_dir": self.temp_dir,
+                    "data_files": {}, "info": {"is_restart": False}}
+        asyncio.run(run_subtask(1, task_env))
+        asyncio.run(run_subtask(1, task_env))
+        assert calls == [1]
+
+        with open(os.path.join('task_3_workdir', 'train.arrow'), 'w') as f:
+            f.write("split version 2")
+        asyncio.run(run_subtask(1, task_env))
+        assert calls == [1, 1]
+
+    def test_memoize_to_disk_tracks_plan_and_restores_summary(self, monkeypatch):
+        """Test that a new subtask 1 plan invalidates the cache and a hit restores the summary."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        summary_file = os.path.join(self.temp_dir, 'structured_summaries.json')
+        calls = []
+
+        @memoize_to_disk(4, 2)
+        async def run_subtask(iteration=1, task_env=None):
+            calls.append(iteration)
+            await utils.save_structured_summary(4, 2, iteration, f"run {len(calls)}", "implement")
+            return {"iteration": iteration}
+
+        task_env = {"workdir": self.temp_dir, "output_dir": self.temp_dir,
+                    "data_files": {}, "info": {"is_restart": False}}
+        asyncio.run(utils.save_structured_summary(4, 1, 1, "plan A", "plan"))
+        asyncio.run(run_subtask(1, task_env))
+
+        # A hit writes the cached run's summary back over a newer one
+        asyncio.run(utils.save_structured_summary(4, 2, 1, "stale", "implement"))
+        asyncio.run(run_subtask(1, task_env))
+        assert calls == [1]
+        with open(summary_file) as f:
+            assert json.load(f)["stage4"]["subtask2"]["iteration1"]["summary"] == "run 1"
+
+        asyncio.run(utils.save_structured_summary(4, 1, 1, "plan B", "plan"))
+        asyncio.run(run_subtask(1, task_env))
+        assert calls == [1, 1]
+
+    def test_run_cached_discussion_reuses_identical_prompt(self, monkeypatch):
+        """Test that the plan cache is opt-in and only reuses discussions for the same prompt."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        calls = []
+
+        async def discuss():
+            calls.append(1)
+            return {"plan": len(calls)}
+
+        def run(prompt):
+            return asyncio.run(utils.run_cached_discussion(5, 1, prompt, discuss))
+
+        assert run("design a model") == {"plan": 1}
+        assert run("design a model") == {"plan": 2}
+
+        monkeypatch.setenv(utils.PLAN_CACHE_ENV, "1")
+        assert run("design a model") == {"plan": 3}
+        assert run("design a model") == {"plan": 3}
+        assert run("design a better model") == {"plan": 4}
+
+    def test_setup_task_environment_tracks_input_changes(self, monkeypatch):
+        """Test that the inputs digest follows the data files and unchanged resumes keep task_info.json."""
+        monkeypatch.chdir(self.temp_dir)
+        with open('metadata.arrow', 'w') as f:
+            f.write("v1")
+
+        first = setup_task_environment(3, is_restart=False)
+        resumed = setup_task_environment(3, is_restart=False)
+        assert resumed["inputs_digest"] == first["inputs_digest"]
+        assert resumed["info"]["timestamp"] == first["info"]["timestamp"]
+
+        with open('metadata.arrow', 'w') as f:
+            f.write("version 2")
+        changed = setup_task_environment(3, is_restart=False)
+        assert changed["inputs_digest"] != first["inputs_digest"]
+
+    def test_clean_directory_keeps_directory(self):
+        """Test that clean_directory empties the directory, including subdirectories and symlinks."""
+        workdir = os.path.join(self.temp_dir, 'task_3_workdir')
+        os.makedirs(os.path.join(workdir, 'plots'))
+        open(os.path.join(workdir, 'split.arrow'), 'w').close()
+        os.symlink(self.temp_dir, os.path.join(workdir, 'link'))
+
+        clean_directory(workdir)
+        assert os.listdir(workdir) == []
+        assert os.path.isdir(self.temp_dir)
+
+    def test_install_checklist_copies_per_directory(self, monkeypatch):
+        """Test that each task directory gets its own copy of the checklist."""
+        monkeypatch.setattr(utils, 'memory_dir', self.temp_dir)
+        first_dir = os.path.join(self.temp_dir, 'task_3_workdir')
+        second_dir = os.path.join(self.temp_dir, 'task_4_workdir')
+        os.makedirs(first_dir)
+        os.makedirs(second_dir)
+
+        first = install_checklist('plot_quality', first_dir)
+        second = install_checklist('plot_quality', second_dir)
+        install_checklist('plot_quality', first_dir)
+
+        assert os.path.basename(first) == 'plot_quality_checklist.txt'
+        assert os.listdir(first_dir) == ['plot_quality_checklist.txt']
+        with open(first, 'w') as f:
+            f.write("edited")
+        with open(second) as f:
+            assert 'PLOT QUALITY CHECKLIST' in f.read()
+        assert install_checklist('plot_quality', first_dir) == first
+        with open(first) as f:
+            assert 'PLOT QUALITY CHECKLIST' in f.read()
+
+    def test_get_task_text_formats_iteration(self):
+        """Test that prompt placeholders are substituted and missing parameters leave the text as-is."""
+        revision = get_task_text('data_split', 'subtask_2_revision', iteration=3)
+        assert 'ITERATION 3 of this subtask' in revision
+        assert '{iteration}' not in revision
+
+        unformatted = get_task_text('data_split', 'subtask_2_revision', other=1)
+        assert '{iteration}' in unformatted
+
+    def test_iter_society_messages(self):
+        """Test that the society transcript starts with the task and ends with the final message."""
+        class Result:
+            inner_messages = ["critic feedback", "engineer revision"]
+            chat_message = "summary"
+
+        transcript = list(iter_society_messages("task", Result()))
+        assert transcript == ["task", "critic feedback", "engineer revision", "summary"]
+
+        Result.inner_messages = None
+        Result.chat_message = None
+        assert list(iter_society_messages("task", Result())) == ["task"]
+
+    def test_write_json_atomic_drop_cache(self, monkeypatch):
+        """Test that only payloads above the threshold are evicted from the page cache."""
+        advised = []
+        monkeypatch.setattr(utils.os, 'posix_fadvise', lambda *args: advised.append(args), raising=False)
+        path = os.path.join(self.temp_dir, 'structured_messages.json')
+
+        write_json_atomic(path, {"stage3": {}}, drop_cache=True)
+        assert advised == []
+
+        write_json_atomic(path, {"stage3": "x" * utils.PAGE_CACHE_DROP_MIN_BYTES}, drop_cache=True)
+        assert len(advised) == 1
+        with open(path) as f:
+            assert len(json.load(f)["stage3"]) == utils.PAGE_CACHE_DROP_MIN_BYTES
@@ -12,7 +12,9 @@ from utils import (
     format_structured_task_prompt,
     get_workflow_state,
     update_workflow_state,
-    save_workflow_checkpoint
+    save_workflow_checkpoint,
+    latest_subtask_iteration,
+    resume_stage
 )
 
 pytestmark = pytest.mark.asyncio  # Mark all tests in this module as asyncio tests
@@ -125,14 +127,12 @@ class TestWorkflowState:
             await save_messages_structured(stage, subtask, iteration, mock_messages, summary, task_description)
             
             # Verify saved messages
-            messages_file = os.path.join(self.temp_dir, 'structured_messages.json')
+            messages_file = os.path.join(self.temp_dir, 'structured_messages',
+                                         f"stage{stage}_subtask{subtask}_iteration{iteration}.json")
             with open(messages_file, 'r') as f:
                 saved_messages = json.load(f)
             
-            assert f"stage{stage}" in saved_messages
-            assert f"subtask{subtask}" in saved_messages[f"stage{stage}"]
-            assert f"iteration{iteration}" in saved_messages[f"stage{stage}"][f"subtask{subtask}"]
-            assert len(saved_messages[f"stage{stage}"][f"subtask{subtask}"][f"iteration{iteration}"]) == 2
+            assert [message["content"] for message in saved_messages] == ["Message 1 content", "Message 2 content"]
             
             # Verify saved summary
             summary_file = os.path.join(self.temp_dir, 'structured_summaries.json')
@@ -311,4 +311,27 @@ class TestWorkflowState:
             
             # Verify the workflow state has the correct latest iteration
             state = get_workflow_state()
-            assert state["iterations"]["stage3"]["subtask2"] == 2 
\ No newline at end of file
+            assert state["iterations"]["stage3"]["subtask2"] == 2 
+    
+    def test_latest_subtask_iteration(self):
+        """Test that the resume point is the highest recorded subtask, compared numerically."""
+        state = {"iterations": {"stage3": {"subtask2": 3, "subtask10": 1, "subtask1": 1}}}
+        assert latest_subtask_iteration(state, 3) == (10, 1)
+        assert latest_subtask_iteration(state, 4) is None
+        assert latest_subtask_iteration({}, 3) is None
+
+    async def test_resume_stage_dispatches_latest_subtask(self, monkeypatch):
+        """Test that resuming calls the handler for the highest recorded subtask with its iteration."""
+        monkeypatch.chdir(self.temp_dir)
+        calls = []
+
+        async def resume_subtask_2(iteration, task_env):
+            calls.append((iteration, task_env["info"]["is_restart"]))
+
+        state = {"current_stage": 3, "iterations": {"stage3": {"subtask1": 1, "subtask2": 2}}}
+        assert await resume_stage(state, {2: resume_subtask_2})
+        assert calls == [(2, False)]
+
+        state = {"current_stage": 3, "iterations": {}}
+        assert not await resume_stage(state, {2: resume_subtask_2})
+        assert calls == [(2, False)]
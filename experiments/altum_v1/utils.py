@@ -1,16 +1,34 @@
 import os
+import re
+import fnmatch
 import yaml
+import asyncio
 import sys
 import json
 import datetime
-import glob
+import time
 import shutil
+import functools
+import itertools
+import hashlib
+import pickle
+import aiofiles
+import asyncio_atexit
+
+# orjson is an optional, faster JSON encoder; fall back to the stdlib when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Define memory directory as a module-level constant so it can be patched in tests
 memory_dir = 'memory'
 
 from autogen_ext.models.openai import OpenAIChatCompletionClient
+from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
+from docker.types import DeviceRequest
 from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.messages import TextMessage
 from autogen_core.tools import FunctionTool
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -24,6 +42,26 @@ from altum_v1.tools import (
     read_arrow_file
 )
 
+def use_fast_event_loop():
+    """Use uvloop for the asyncio event loop when it is installed.
+    
+    Must be called before asyncio.run(). Falls back to the default event loop
+    on Windows or when uvloop isn't available.
+    """
+    if sys.platform == "win32":
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+# Glob patterns for temporary files left behind by code execution
+TEMP_FILE_PATTERNS = ("tmp_code_*", "*.pyc", "__pycache__")
+
+# All patterns compiled into one regex, so each directory entry is matched once
+_TEMP_FILE_RE = re.compile("|".join(fnmatch.translate(pattern) for pattern in TEMP_FILE_PATTERNS))
+
 # Clean up temporary code files
 def cleanup_temp_files(directory="."):
     """Remove temporary code files created during execution.
@@ -31,41 +69,87 @@ def cleanup_temp_files(directory="."):
     Args:
         directory: Directory to clean (defaults to current directory)
     """
-    # Pattern for temporary code files
-    patterns = ["tmp_code_*", "*.pyc", "__pycache__"]
+    # A single directory scan yields both the matching names and their types
+    with os.scandir(directory) as entries:
+        matches = [entry for entry in entries if _TEMP_FILE_RE.match(entry.name)]
     
-    total_removed = 0
-    for pattern in patterns:
-        for file_path in glob.glob(os.path.join(directory, pattern)):
+    # Most calls find nothing to remove
+    if not matches:
+        return 0
+    
+    removed = []
+    errors = []
+    # Unlink files relative to one directory handle (unlinkat) so the directory
+    # path isn't resolved again for every file
+    dir_fd = os.open(directory, os.O_RDONLY) if os.unlink in os.supports_dir_fd else None
+    try:
+        for entry in matches:
             try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-                    print(f"Removed: {file_path}")
-                    total_removed += 1
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-                    print(f"Removed directory: {file_path}")
-                    total_removed += 1
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                    removed.append(f"Removed directory: {entry.path}")
+                else:
+                    if dir_fd is not None:
+                        os.unlink(entry.name, dir_fd=dir_fd)
+                    else:
+                        os.unlink(entry.path)
+                    removed.append(f"Removed: {entry.path}")
             except Exception as e:
-                print(f"Error removing {file_path}: {e}")
+                errors.append(f"Error removing {entry.path}: {e}")
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    
+    # Report the removals and failures in one write rather than one print per entry
+    if removed or errors:
+        sys.stdout.write("\n".join(removed + errors) + "\n")
+    print(f"Cleanup complete. Removed {len(removed)} temporary files/directories.")
+    return len(removed)
+
+async def cleanup_temp_files_async(directory="."):
+    """Run cleanup_temp_files in a worker thread so it can overlap other I/O.
     
-    print(f"Cleanup complete. Removed {total_removed} temporary files/directories.")
-    return total_removed
+    Args:
+        directory: Directory to clean (defaults to current directory)
+    """
+    return await asyncio.to_thread(cleanup_temp_files, directory)
+
+@functools.lru_cache(maxsize=4)
+def _load_agent_configs_cached(config_path, mtime):
+    """Parse the agent YAML. Keyed on mtime so edits to the file are picked up."""
+    with open(config_path, "r") as f:
+        configs = yaml.safe_load(f)
+    return configs.get("agents", [])
 
 def load_agent_configs(config_path=None):
-    """Load agent configurations from YAML file."""
+    """Load agent configurations from YAML file.
+    
+    The parsed configs are cached per (path, mtime), so repeated calls across
+    subtasks and retries don't re-parse the YAML unless the file has changed.
+    """
     if config_path is None:
         # Use path relative to current file
         config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
                                   "config/agents.yaml")
     
-    with open(config_path, "r") as f:
-        configs = yaml.safe_load(f)
-    return configs.get("agents", [])
+    return _load_agent_configs_cached(config_path, os.path.getmtime(config_path))
+
+# Expose cache invalidation for explicit restarts
+load_agent_configs.cache_clear = _load_agent_configs_cached.cache_clear
+
+# Tool instances are stateless wrappers, so one set is shared by all agents
+_tool_instances = None
 
 def create_tool_instances():
-    """Create instances of all available tools."""
-    tools = {
+    """Create instances of all available tools.
+    
+    The tools are created once per process and reused on subsequent calls.
+    """
+    global _tool_instances
+    if _tool_instances is not None:
+        return _tool_instances
+    
+    _tool_instances = {
         "perplexity_search": FunctionTool(
             query_perplexity, 
             strict=True, 
@@ -104,13 +188,123 @@ def create_tool_instances():
             name="read_arrow_file"
         )
     }
-    return tools
+    return _tool_instances
+
+# Docker executor start-ups, keyed on (image, work_dir, timeout). Each entry is the
+# task starting the container, so concurrent callers share one container.
+_executor_pool = {}
+
+async def _start_code_executor(image, work_dir, timeout):
+    """Create and start a GPU-enabled Docker code executor."""
+    code_executor = DockerCommandLineCodeExecutor(
+        image=image,
+        work_dir=work_dir,
+        timeout=timeout,
+        device_requests=[DeviceRequest(count=-1, capabilities=[["gpu"]])]
+    )
+    await code_executor.start()
+    return code_executor
+
+def _executor_start_failed(starting):
+    """Check whether a pooled executor start-up finished without a usable executor."""
+    return starting.done() and (starting.cancelled() or starting.exception() is not None)
+
+async def get_code_executor(work_dir, timeout=300, image='agenv:latest'):
+    """Get a started Docker code executor, reusing a pooled one if available.
+    
+    Starting a container is the slowest part of setting up the engineer team, so
+    executors are kept running across iterations and retries and only created when
+    a new (image, work_dir, timeout) combination is requested. Callers arriving
+    while the container is still starting wait for that start-up instead of
+    launching a second container; a failed start-up is retried by the next call.
+    
+    Args:
+        work_dir: Working directory mounted into the container
+        timeout: Code execution timeout in seconds
+        image: Docker image to run
+        
+    Returns:
+        DockerCommandLineCodeExecutor: A started executor
+    """
+    key = (image, work_dir, timeout)
+    starting = _executor_pool.get(key)
+    if starting is None or _executor_start_failed(starting):
+        # Stop the pooled containers when the event loop shuts down
+        if not _executor_pool:
+            asyncio_atexit.register(stop_code_executors)
+        starting = asyncio.ensure_future(_start_code_executor(image, work_dir, timeout))
+        _executor_pool[key] = starting
+    
+    # Shield the shared start-up so one cancelled caller doesn't cancel it for the others
+    return await asyncio.shield(starting)
+
+def prestart_code_executor(work_dir, timeout=300, image='agenv:latest'):
+    """Start a pooled Docker code executor in the background.
+    
+    Lets the container boot while earlier, executor-free subtasks run. The later
+    get_code_executor call with the same arguments picks up the running (or still
+    starting) container, and surfaces any start-up error.
+    
+    Args:
+        work_dir: Working directory mounted into the container
+        timeout: Code execution timeout in seconds
+        image: Docker image to run
+        
+    Returns:
+        asyncio.Task: The background start-up
+    """
+    starting = asyncio.ensure_future(get_code_executor(work_dir, timeout=timeout, image=image))
+    # Mark start-up errors as retrieved here; get_code_executor retries and reports them
+    starting.add_done_callback(lambda task: task.cancelled() or task.exception())
+    return starting
+
+async def stop_code_executors():
+    """Stop all pooled Docker code executors."""
+    while _executor_pool:
+        _, starting = _executor_pool.popitem()
+        if not starting.done():
+            starting.cancel()
+            continue
+        if _executor_start_failed(starting):
+            continue
+        try:
+            await starting.result().stop()
+        except Exception as e:
+            print(f"Error stopping code executor: {e}")
+
+# Model clients keyed on model name, shared so their HTTP connection pools are reused
+_model_clients = {}
+
+def get_model_client(model_name):
+    """Get a shared chat completion client for a model.
+    
+    Args:
+        model_name: Name of the OpenAI model
+        
+    Returns:
+        OpenAIChatCompletionClient: Client reused across agents, iterations and retries
+    """
+    if model_name not in _model_clients:
+        # Close the pooled clients when the event loop shuts down
+        if not _model_clients:
+            asyncio_atexit.register(close_model_clients)
+        _model_clients[model_name] = OpenAIChatCompletionClient(model=model_name)
+    return _model_clients[model_name]
+
+async def close_model_clients():
+    """Close all shared model clients."""
+    while _model_clients:
+        _, model_client = _model_clients.popitem()
+        try:
+            await model_client.close()
+        except Exception as e:
+            print(f"Error closing model client: {e}")
 
 def initialize_agents(agent_configs, tools, selected_agents=None, model_name="gpt-4.1"):
     """Initialize agents based on configurations."""
 
     # TODO: module_name should be parameterized by agents.yaml
-    model_client = OpenAIChatCompletionClient(model=model_name)
+    model_client = get_model_client(model_name)
 
     # Get current date once for this initialization
     today_date = datetime.date.today().isoformat()
@@ -221,8 +415,7 @@ async def save_messages(task_number: int, messages: list, summary: str, task_des
     # Save all messages
     all_messages_file = os.path.join(memory_dir, 'all_messages.json')
     try:
-        with open(all_messages_file, 'r') as f:
-            all_messages = json.load(f)
+        all_messages = read_json(all_messages_file)
     except (FileNotFoundError, json.JSONDecodeError):
         all_messages = {}
     
@@ -232,14 +425,12 @@ async def save_messages(task_number: int, messages: list, summary: str, task_des
         key = f"task{task_number}_subtask{subtask_number}"
     all_messages[key] = [msg.dump() for msg in messages]
     
-    with open(all_messages_file, 'w') as f:
-        json.dump(all_messages, f)
+    write_json_atomic(all_messages_file, all_messages)
     
     # Save summary with task description
     summary_file = os.path.join(memory_dir, 'all_meeting_summaries.json')
     try:
-        with open(summary_file, 'r') as f:
-            summaries = json.load(f)
+        summaries = read_json(summary_file)
     except (FileNotFoundError, json.JSONDecodeError):
         summaries = {}
     
@@ -258,8 +449,7 @@ COMPLETED TASK RESULT:
 {summary}"""
     summaries[key].append(full_summary)
     
-    with open(summary_file, 'w') as f:
-        json.dump(summaries, f)
+    write_json_atomic(summary_file, summaries)
 
 async def format_task_prompt(task_text: str, previous_summaries: str) -> str:
     """Format a task prompt with all previous summaries and task descriptions.
@@ -303,8 +493,7 @@ def get_workflow_state():
     state_file = os.path.join(memory_dir, 'workflow_state.json')
     
     try:
-        with open(state_file, 'r') as f:
-            return json.load(f)
+        return read_json(state_file)
     except (FileNotFoundError, json.JSONDecodeError):
         # Default initial state
         return {
@@ -342,8 +531,7 @@ def update_workflow_state(stage, subtask=None, iteration=None):
         if iteration is not None:
             state["iterations"][stage_key][subtask_key] = iteration
     
-    with open(state_file, 'w') as f:
-        json.dump(state, f)
+    write_json_atomic(state_file, state)
 
 async def save_structured_summary(stage, subtask, iteration, summary, task_description):
     """Save a summary in a structured format.
@@ -359,8 +547,7 @@ async def save_structured_summary(stage, subtask, iteration, summary, task_descr
     summary_file = os.path.join(memory_dir, 'structured_summaries.json')
     
     try:
-        with open(summary_file, 'r') as f:
-            summaries = json.load(f)
+        summaries = read_json(summary_file)
     except (FileNotFoundError, json.JSONDecodeError):
         summaries = {}
     
@@ -386,8 +573,7 @@ async def save_structured_summary(stage, subtask, iteration, summary, task_descr
     iter_key = f"iteration{iteration}"
     summaries[stage_key][subtask_key][iter_key] = full_summary
     
-    with open(summary_file, 'w') as f:
-        json.dump(summaries, f)
+    write_json_atomic(summary_file, summaries)
     
     # Update the workflow state
     update_workflow_state(stage, subtask, iteration)
@@ -406,8 +592,7 @@ async def get_structured_summaries(current_stage, current_subtask=None, current_
     summary_file = os.path.join(memory_dir, 'structured_summaries.json')
     
     try:
-        with open(summary_file, 'r') as f:
-            all_summaries = json.load(f)
+        all_summaries = read_json(summary_file)
     except (FileNotFoundError, json.JSONDecodeError):
         return "No previous summaries available."
     
@@ -560,6 +745,69 @@ COMPLETED TASK RESULT:
 
 # Enhanced versions of existing functions that use the new structured approach
 
+def get_last_message_content(result):
+    """Get the serialized content of a team run's last message.
+    
+    Equivalent to result.messages[-1].dump()["content"], but only the content
+    field is serialized instead of the whole message.
+    
+    Args:
+        result: TaskResult from a team run
+        
+    Returns:
+        The content of the last message
+    """
+    return result.messages[-1].model_dump(mode="json", include={"content"})["content"]
+
+def iter_society_messages(task_message, result):
+    """Iterate over the full transcript of an EngineerSociety run.
+    
+    Yields the task message, the inner messages and the final chat message
+    without building an intermediate list.
+    
+    Args:
+        task_message: The task message the society was run with
+        result: Response from EngineerSociety.on_messages
+        
+    Returns:
+        An iterator over the transcript messages
+    """
+    return itertools.chain(
+        (task_message,),
+        result.inner_messages or (),
+        (result.chat_message,) if result.chat_message else ()
+    )
+
+async def save_society_result(stage, subtask, iteration, task_message, result, task_description,
+                              summary_file, cleanup_dirs=(".",), default_summary="No result"):
+    """Record an EngineerSociety run and clean up after it.
+    
+    The transcript (which also records the summary in the structured summaries)
+    and the temp-file cleanups are independent, so they run together. The
+    summary file is queued for a durable background write so the workflow can
+    move on; await flush_text_writes() before relying on it.
+    
+    Args:
+        stage: The stage number
+        subtask: The subtask number
+        iteration: The iteration number for this subtask
+        task_message: The task message the society was run with
+        result: Response from EngineerSociety.on_messages
+        task_description: The task description
+        summary_file: Path of the text file to write the final summary to
+        cleanup_dirs: Directories to remove temporary files from
+        default_summary: Summary recorded when the society returned no final message
+    """
+    summary_content = result.chat_message.content if result.chat_message else default_summary
+    pending = [save_messages_structured(stage, subtask, iteration,
+                                        iter_society_messages(task_message, result),
+                                        summary_content, task_description)]
+    pending.extend(cleanup_temp_files_async(directory) for directory in cleanup_dirs)
+    if result.chat_message and isinstance(result.chat_message, TextMessage):
+        queue_text_write(summary_file, summary_content, durable=True)
+        print(f"Writing summary to {summary_file}")
+    await asyncio.gather(*pending)
+
 async def save_messages_structured(stage, subtask, iteration, messages, summary, task_description):
     """Save messages and summary using the structured approach.
     
@@ -567,33 +815,20 @@ async def save_messages_structured(stage, subtask, iteration, messages, summary,
         stage: The stage number
         subtask: The subtask number
         iteration: The iteration number for this subtask
-        messages: List of messages to save
+        messages: Iterable of messages to save
         summary: The summary to save
         task_description: The task description
     """
-    os.makedirs(memory_dir, exist_ok=True)
-    
-    # Save messages
-    messages_file = os.path.join(memory_dir, 'structured_messages.json')
-    try:
-        with open(messages_file, 'r') as f:
-            all_messages = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        all_messages = {}
+    # Each iteration's transcript gets its own file, so a save only writes that
+    # iteration's messages instead of re-reading and rewriting every earlier transcript
+    messages_dir = os.path.join(memory_dir, 'structured_messages')
+    os.makedirs(messages_dir, exist_ok=True)
+    messages_file = os.path.join(messages_dir, f"stage{stage}_subtask{subtask}_iteration{iteration}.json")
     
-    stage_key = f"stage{stage}"
-    if stage_key not in all_messages:
-        all_messages[stage_key] = {}
-    
-    subtask_key = f"subtask{subtask}"
-    if subtask_key not in all_messages[stage_key]:
-        all_messages[stage_key][subtask_key] = {}
-    
-    iter_key = f"iteration{iteration}"
-    all_messages[stage_key][subtask_key][iter_key] = [msg.dump() for msg in messages]
-    
-    with open(messages_file, 'w') as f:
-        json.dump(all_messages, f)
+    # Stream the transcript into a temp file and move it into place once complete.
+    # Transcripts grow to megabytes and aren't read back during the run, so keep
+    # them from crowding the configs and data files out of the page cache.
+    write_json_atomic(messages_file, [msg.dump() for msg in messages], drop_cache=True)
     
     # Save the summary
     await save_structured_summary(stage, subtask, iteration, summary, task_description)
@@ -646,26 +881,25 @@ def get_workflow_checkpoints():
     checkpoint_file = os.path.join(memory_dir, 'workflow_checkpoints.json')
     
     try:
-        with open(checkpoint_file, 'r') as f:
-            return json.load(f)
+        return read_json(checkpoint_file)
     except (FileNotFoundError, json.JSONDecodeError):
         return {
             "stages_completed": [],
             "checkpoints": {}
         }
 
-def save_workflow_checkpoint(stage, subtask=None, iteration=None, label=None):
-    """Save a workflow checkpoint.
+def _build_checkpoint(stage, subtask=None, iteration=None, label=None):
+    """Build a checkpoint entry capturing the current workflow state.
     
     Args:
         stage: Stage number
         subtask: Optional subtask number
         iteration: Optional iteration number
         label: Optional human-readable label for the checkpoint
+        
+    Returns:
+        tuple: (checkpoint_id, checkpoint entry)
     """
-    os.makedirs(memory_dir, exist_ok=True)
-    checkpoint_file = os.path.join(memory_dir, 'workflow_checkpoints.json')
-    
     # Generate timestamp
     timestamp = datetime.datetime.now().isoformat()
     
@@ -685,11 +919,7 @@ def save_workflow_checkpoint(stage, subtask=None, iteration=None, label=None):
             if iteration is not None:
                 label += f", Iteration {iteration}"
     
-    # Get current checkpoints
-    checkpoints = get_workflow_checkpoints()
-    
-    # Add new checkpoint
-    checkpoints["checkpoints"][checkpoint_id] = {
+    checkpoint = {
         "timestamp": timestamp,
         "stage": stage,
         "subtask": subtask,
@@ -697,17 +927,233 @@ def save_workflow_checkpoint(stage, subtask=None, iteration=None, label=None):
         "label": label,
         "state": get_workflow_state()  # Save the current workflow state
     }
+    return checkpoint_id, checkpoint
+
+def _write_checkpoints(entries):
+    """Add checkpoint entries to the checkpoints file with a single write.
     
-    # Update stages completed if this is a stage completion
-    if subtask is None and stage not in checkpoints["stages_completed"]:
-        checkpoints["stages_completed"].append(stage)
+    Args:
+        entries: List of (checkpoint_id, checkpoint entry) tuples
+    """
+    os.makedirs(memory_dir, exist_ok=True)
+    checkpoint_file = os.path.join(memory_dir, 'workflow_checkpoints.json')
     
-    # Save updated checkpoints
-    with open(checkpoint_file, 'w') as f:
-        json.dump(checkpoints, f, indent=2)
+    # Get current checkpoints
+    checkpoints = get_workflow_checkpoints()
+    
+    for checkpoint_id, checkpoint in entries:
+        # Add new checkpoint
+        checkpoints["checkpoints"][checkpoint_id] = checkpoint
+        
+        # Update stages completed if this is a stage completion
+        stage = checkpoint["stage"]
+        if checkpoint["subtask"] is None and stage not in checkpoints["stages_completed"]:
+            checkpoints["stages_completed"].append(stage)
+    
+    # Save updated checkpoints; a whole batch shares one file and directory fsync
+    write_json_atomic(checkpoint_file, checkpoints, durable=True, indent=2)
+
+def save_workflow_checkpoint(stage, subtask=None, iteration=None, label=None):
+    """Save a workflow checkpoint.
+    
+    Args:
+        stage: Stage number
+        subtask: Optional subtask number
+        iteration: Optional iteration number
+        label: Optional human-readable label for the checkpoint
+    """
+    checkpoint_id, checkpoint = _build_checkpoint(stage, subtask, iteration, label)
+    _write_checkpoints([(checkpoint_id, checkpoint)])
+    return checkpoint_id
+
+# Background checkpoint writing, so checkpoint I/O doesn't block the event loop
+_checkpoint_queue = None
+_checkpoint_writer_task = None
+
+# Minimum wall-clock gap between background checkpoint writes. Checkpoints
+# queued inside the window are held back and written together, not dropped.
+CHECKPOINT_MIN_INTERVAL_S = 10
+_last_ckpt_ts = 0.0
+_pending_ckpt = []
+_checkpoint_force = None
+
+async def _checkpoint_writer():
+    """Drain queued checkpoints, writing everything pending in one file update."""
+    global _last_ckpt_ts
+    while True:
+        _pending_ckpt.append(await _checkpoint_queue.get())
+        
+        # Hold the write back until the minimum interval has passed, unless forced
+        remaining = CHECKPOINT_MIN_INTERVAL_S - (time.monotonic() - _last_ckpt_ts)
+        if remaining > 0 and not _checkpoint_force.is_set():
+            try:
+                await asyncio.wait_for(_checkpoint_force.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        _checkpoint_force.clear()
+        
+        while not _checkpoint_queue.empty():
+            _pending_ckpt.append(_checkpoint_queue.get_nowait())
+        batch = list(_pending_ckpt)
+        try:
+            await asyncio.to_thread(_write_checkpoints, batch)
+            _last_ckpt_ts = time.monotonic()
+        except Exception as e:
+            print(f"Error writing checkpoints: {e}")
+        finally:
+            _pending_ckpt.clear()
+            for _ in batch:
+                _checkpoint_queue.task_done()
+
+def _drain_checkpoint_queue():
+    """Write any checkpoints still queued when the event loop shuts down."""
+    pending = list(_pending_ckpt)
+    _pending_ckpt.clear()
+    while _checkpoint_queue is not None and not _checkpoint_queue.empty():
+        pending.append(_checkpoint_queue.get_nowait())
+    if pending:
+        _write_checkpoints(pending)
+
+def queue_workflow_checkpoint(stage, subtask=None, iteration=None, label=None, force=False):
+    """Queue a workflow checkpoint to be written by a background task.
+    
+    The checkpoint captures the workflow state at the time of the call. Writes
+    are spaced at least CHECKPOINT_MIN_INTERVAL_S apart unless forced. Must be
+    called with an event loop running; use flush_workflow_checkpoints() before
+    reading or modifying the checkpoints file directly.
     
+    Args:
+        stage: Stage number
+        subtask: Optional subtask number
+        iteration: Optional iteration number
+        label: Optional human-readable label for the checkpoint
+        force: Write without waiting for the minimum interval
+        
+    Returns:
+        str: The ID of the queued checkpoint
+    """
+    global _checkpoint_queue, _checkpoint_writer_task, _checkpoint_force
+    if _checkpoint_writer_task is None or _checkpoint_writer_task.done():
+        _checkpoint_queue = asyncio.Queue()
+        _checkpoint_force = asyncio.Event()
+        _checkpoint_writer_task = asyncio.create_task(_checkpoint_writer())
+        asyncio_atexit.register(_drain_checkpoint_queue)
+    
+    checkpoint_id, checkpoint = _build_checkpoint(stage, subtask, iteration, label)
+    _checkpoint_queue.put_nowait((checkpoint_id, checkpoint))
+    if force:
+        _checkpoint_force.set()
     return checkpoint_id
 
+async def flush_workflow_checkpoints():
+    """Write all queued checkpoints now and wait for them to land."""
+    if _checkpoint_queue is not None:
+        _checkpoint_force.set()
+        await _checkpoint_queue.join()
+
+# Background writing of stage output files (e.g. implementation summaries), so the
+# next subtask can start while the file is still being written
+_text_write_queue = None
+_text_writer_task = None
+_pending_text_writes = []
+
+def _write_text(path, content, durable=False):
+    """Write a text file, opening it with O_DSYNC when durable."""
+    # Encode once and write the bytes in binary mode, skipping the text layer's
+    # chunked encoding and newline translation. Payloads larger than the buffer
+    # go straight to write(2).
+    payload = content.encode("utf-8")
+    with open(path, "wb", opener=_dsync_opener if durable else None) as f:
+        f.write(payload)
+
+async def _text_writer():
+    """Write queued text files one at a time, in the order they were queued."""
+    while True:
+        item = await _text_write_queue.get()
+        _pending_text_writes.append(item)
+        try:
+            await asyncio.to_thread(_write_text, *item)
+        except Exception as e:
+            print(f"Error writing {item[0]}: {e}")
+        finally:
+            _pending_text_writes.remove(item)
+            _text_write_queue.task_done()
+
+def _drain_text_write_queue():
+    """Write any text files still queued when the event loop shuts down."""
+    pending = list(_pending_text_writes)
+    _pending_text_writes.clear()
+    while _text_write_queue is not None and not _text_write_queue.empty():
+        pending.append(_text_write_queue.get_nowait())
+    for item in pending:
+        _write_text(*item)
+
+def queue_text_write(path, content, durable=False):
+    """Queue a text file to be written by a background task.
+    
+    Must be called with an event loop running; use flush_text_writes() before
+    reading the file back.
+    
+    Args:
+        path: Destination file path
+        content: Text to write
+        durable: Only consider the write done once the data is on stable storage
+    """
+    global _text_write_queue, _text_writer_task
+    if _text_writer_task is None or _text_writer_task.done():
+        _text_write_queue = asyncio.Queue()
+        _text_writer_task = asyncio.create_task(_text_writer())
+        asyncio_atexit.register(_drain_text_write_queue)
+    
+    _text_write_queue.put_nowait((path, content, durable))
+
+async def flush_text_writes():
+    """Wait for all queued text files to be written.
+    
+    Stages await this before mark_stage_completed() so a completed stage
+    always has its summary files on disk.
+    """
+    if _text_write_queue is not None:
+        await _text_write_queue.join()
+
+class CheckpointBatch:
+    """Collect several checkpoints for a stage and persist them in one write.
+    
+    Use for checkpoints that are only meaningful together, e.g. the last
+    subtask of a stage and the hand-off to the next stage. Anything that
+    must reach disk immediately should still use save_workflow_checkpoint.
+    """
+    
+    def __init__(self, stage):
+        self.stage = stage
+        self.entries = []
+    
+    def add(self, subtask=None, iteration=None, label=None, stage=None):
+        """Add a checkpoint to the batch, capturing the current workflow state.
+        
+        Args:
+            subtask: Optional subtask number
+            iteration: Optional iteration number
+            label: Optional human-readable label for the checkpoint
+            stage: Optional stage number, defaults to the batch's stage
+            
+        Returns:
+            str: The ID of the batched checkpoint
+        """
+        stage = self.stage if stage is None else stage
+        checkpoint_id, checkpoint = _build_checkpoint(stage, subtask, iteration, label)
+        self.entries.append((checkpoint_id, checkpoint))
+        return checkpoint_id
+    
+    async def flush(self):
+        """Write all batched checkpoints with a single file update."""
+        if not self.entries:
+            return
+        entries, self.entries = self.entries, []
+        # Let queued checkpoints land first so the two writers don't race
+        await flush_workflow_checkpoints()
+        await asyncio.to_thread(_write_checkpoints, entries)
+
 def mark_stage_completed(stage):
     """Mark a workflow stage as completed.
     
@@ -719,8 +1165,7 @@ def mark_stage_completed(stage):
     if stage not in checkpoints["stages_completed"]:
         checkpoints["stages_completed"].append(stage)
         
-        with open(os.path.join(memory_dir, 'workflow_checkpoints.json'), 'w') as f:
-            json.dump(checkpoints, f, indent=2)
+        write_json_atomic(os.path.join(memory_dir, 'workflow_checkpoints.json'), checkpoints, durable=True, indent=2)
 
 def is_stage_completed(stage):
     """Check if a workflow stage is completed.
@@ -762,6 +1207,50 @@ def get_latest_checkpoint(stage=None, subtask=None):
     filtered.sort(key=lambda x: x[1]["timestamp"], reverse=True)
     return {filtered[0][0]: filtered[0][1]}
 
+def latest_subtask_iteration(state, stage):
+    """Find the highest recorded subtask of a stage and its iteration.
+    
+    Args:
+        state: Workflow state dictionary
+        stage: The stage number
+        
+    Returns:
+        tuple: (subtask, iteration), or None if the stage has no recorded subtasks
+    """
+    latest = None
+    for subtask_key, iteration in state.get("iterations", {}).get(f"stage{stage}", {}).items():
+        # Keys look like 'subtask2'; slicing off the prefix is cheaper than replace()
+        subtask = int(subtask_key[len("subtask"):])
+        if latest is None or subtask > latest[0]:
+            latest = (subtask, iteration)
+    return latest
+
+async def resume_stage(state, handlers):
+    """Resume a stage at the highest subtask recorded in a restored workflow state.
+    
+    Args:
+        state: Workflow state returned by resume_from_checkpoint
+        handlers: Dict mapping subtask numbers to async handlers called as
+            handler(iteration, task_env); subtasks without a handler are skipped
+        
+    Returns:
+        bool: True if the stage had a recorded subtask to resume from
+    """
+    stage = state["current_stage"]
+    latest = latest_subtask_iteration(state, stage)
+    if latest is None:
+        return False
+    highest_subtask, current_iteration = latest
+    
+    # Create task environment for resumed task (don't clean directory)
+    task_env = setup_task_environment(stage, highest_subtask, is_restart=False)
+    print(f"Resuming at Stage {stage}, Subtask {highest_subtask}, Iteration {current_iteration}")
+    
+    handler = handlers.get(highest_subtask)
+    if handler is not None:
+        await handler(current_iteration, task_env)
+    return True
+
 def get_maximum_iteration(stage, subtask):
     """Get the maximum iteration number for a stage/subtask.
     
@@ -775,8 +1264,7 @@ def get_maximum_iteration(stage, subtask):
     summary_file = os.path.join(memory_dir, 'structured_summaries.json')
     
     try:
-        with open(summary_file, 'r') as f:
-            all_summaries = json.load(f)
+        all_summaries = read_json(summary_file)
     except (FileNotFoundError, json.JSONDecodeError):
         return 0
     
@@ -824,8 +1312,11 @@ async def clear_workflow_state(stage=None):
     
     # Save the updated state
     os.makedirs(memory_dir, exist_ok=True)
-    with open(os.path.join(memory_dir, 'workflow_state.json'), 'w') as f:
-        json.dump(state, f)
+    write_json_atomic(os.path.join(memory_dir, 'workflow_state.json'), state)
+    
+    # A restart re-reads the agent and task configs, even if an edit kept the same mtime
+    load_agent_configs.cache_clear()
+    load_task_prompts.cache_clear()
 
 async def list_available_workflow_options():
     """List available workflow options for restart/resume.
@@ -940,7 +1431,8 @@ async def prompt_for_workflow_action(current_stage):
     
     # Build the prompt string based on available options
     prompt_options = "/".join(available_options)
-    choice = input(f"Enter your choice ({prompt_options}): ").strip().upper()
+    # Read input off the event loop so background tasks keep running while we wait
+    choice = (await asyncio.to_thread(input, f"Enter your choice ({prompt_options}): ")).strip().upper()
     
     if choice == "R" and has_resume_option:
         return {
@@ -949,7 +1441,7 @@ async def prompt_for_workflow_action(current_stage):
         }
     elif choice == "S":
         if not prereq_ready and current_stage > 1:
-            confirm = input(f"Stage {current_stage-1} is not completed. Proceed anyway? (y/n): ").lower()
+            confirm = (await asyncio.to_thread(input, f"Stage {current_stage-1} is not completed. Proceed anyway? (y/n): ")).lower()
             if confirm != 'y':
                 return await prompt_for_workflow_action(current_stage)  # Ask again
         return {
@@ -957,7 +1449,7 @@ async def prompt_for_workflow_action(current_stage):
             "stage": current_stage
         }
     elif choice == "C" and (current_stage > 1 or has_resume_option):
-        confirm = input("This will erase ALL previous work. Are you sure? (y/n): ").lower()
+        confirm = (await asyncio.to_thread(input, "This will erase ALL previous work. Are you sure? (y/n): ")).lower()
         if confirm != 'y':
             return await prompt_for_workflow_action(current_stage)  # Ask again
         return {
@@ -987,8 +1479,7 @@ async def resume_from_checkpoint(checkpoint_id):
     
     # Restore the workflow state
     os.makedirs(memory_dir, exist_ok=True)
-    with open(os.path.join(memory_dir, 'workflow_state.json'), 'w') as f:
-        json.dump(checkpoint["state"], f, indent=2)
+    write_json_atomic(os.path.join(memory_dir, 'workflow_state.json'), checkpoint["state"], indent=2)
     
     print(f"Restored workflow state from checkpoint: {checkpoint['label']}")
     print(f"Stage: {checkpoint['stage']}, Subtask: {checkpoint.get('subtask')}, Iteration: {checkpoint.get('iteration')}")
@@ -997,6 +1488,115 @@ async def resume_from_checkpoint(checkpoint_id):
 
 # Work directory management
 
+# Files written with drop_cache=True are only evicted from the page cache above this size
+PAGE_CACHE_DROP_MIN_BYTES = 64 * 1024
+
+def _drop_page_cache(f):
+    """Evict a large, freshly written file from the page cache.
+    
+    posix_fadvise only drops clean pages, so the data is synced first.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    f.flush()
+    fd = f.fileno()
+    if os.fstat(fd).st_size < PAGE_CACHE_DROP_MIN_BYTES:
+        return
+    os.fdatasync(fd)
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def write_json_atomic(path, data, durable=False, drop_cache=False, **json_kwargs):
+    """Write JSON to a file atomically.
+    
+    The payload is written to a temporary file next to the target and moved into
+    place with os.replace, so concurrent readers see either the old or the new
+    file, never a partially written one. Uses orjson for encoding when installed.
+    
+    Args:
+        path: Destination file path
+        data: JSON-serializable data
+        durable: fsync the file and its directory so the write survives a crash
+        drop_cache: Evict the written file from the page cache if it is large
+        **json_kwargs: Extra arguments passed to json.dumps (e.g. indent)
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    indent = json_kwargs.get("indent")
+    if orjson is not None and set(json_kwargs) <= {"indent"} and indent in (None, 2):
+        # orjson encodes straight to bytes in C; it only supports 2-space indentation
+        option = orjson.OPT_INDENT_2 if indent == 2 else 0
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(data, option=option))
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+            if drop_cache:
+                _drop_page_cache(f)
+    else:
+        if indent is None:
+            # Match orjson's compact output instead of json's default ", " and ": "
+            json_kwargs.setdefault("separators", (",", ":"))
+        with open(tmp_path, "w") as f:
+            # json.dump encodes incrementally, so large payloads are never held as one string
+            json.dump(data, f, **json_kwargs)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+            if drop_cache:
+                _drop_page_cache(f)
+    os.replace(tmp_path, path)
+    
+    if durable:
+        # Persist the rename itself
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def _dsync_opener(path, flags):
+    """Open a file with O_DSYNC, where the platform supports it."""
+    return os.open(path, flags | getattr(os, "O_DSYNC", 0), 0o666)
+
+async def write_text_async(path, content, durable=False):
+    """Write a text file without blocking the event loop.
+    
+    Args:
+        path: Destination file path
+        content: Text to write
+        durable: Open the file with O_DSYNC, so the write only completes once the
+            data is on stable storage instead of waiting for kernel writeback
+    """
+    payload = content.encode("utf-8")
+    async with aiofiles.open(path, "wb", opener=_dsync_opener if durable else None) as f:
+        await f.write(payload)
+
+def read_json(path):
+    """Read a JSON file, decoding with orjson when installed.
+    
+    Args:
+        path: File path to read
+        
+    Returns:
+        The decoded JSON data
+    """
+    if orjson is not None:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch either
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r") as f:
+        return json.load(f)
+
+def get_task_workdir_name(stage, workdir_suffix=None):
+    """Get the name of a stage's working directory, like 'task_2_workdir'.
+    
+    Args:
+        stage: The stage number
+        workdir_suffix: Optional suffix replacing 'workdir' in the name
+    """
+    if workdir_suffix:
+        return f"task_{stage}_{workdir_suffix}"
+    return f"task_{stage}_workdir"
+
 def get_task_workdir(stage, clean=False, workdir_suffix=None):
     """Get the task-specific working directory for engineer outputs.
     
@@ -1008,11 +1608,7 @@ def get_task_workdir(stage, clean=False, workdir_suffix=None):
     Returns:
         str: Path to the task-specific working directory
     """
-    # Create base name like 'task_2_workdir' or 'task_2_custom_suffix'
-    if workdir_suffix:
-        workdir_name = f"task_{stage}_{workdir_suffix}"
-    else:
-        workdir_name = f"task_{stage}_workdir"
+    workdir_name = get_task_workdir_name(stage, workdir_suffix)
     
     # Ensure the task workdir exists
     os.makedirs(workdir_name, exist_ok=True)
@@ -1029,17 +1625,20 @@ def clean_directory(directory):
     Args:
         directory: Directory path to clean
     """
-    for item in os.listdir(directory):
-        item_path = os.path.join(directory, item)
-        try:
-            if os.path.isfile(item_path):
-                os.unlink(item_path)
-            elif os.path.isdir(item_path):
-                import shutil
-                shutil.rmtree(item_path)
-        except Exception as e:
-            print(f"Error cleaning {item_path}: {e}")
-    
+    # DirEntry caches the entry type from the directory scan, so no extra stat per entry
+    errors = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+            except OSError as e:
+                errors.append(f"Error cleaning {entry.path}: {e}")
+    
+    if errors:
+        print("\n".join(errors))
     print(f"Cleaned directory: {directory}")
 
 def setup_task_environment(stage, subtask=None, is_restart=False, workdir_suffix=None):
@@ -1066,9 +1665,6 @@ def setup_task_environment(stage, subtask=None, is_restart=False, workdir_suffix
         "output_directory": output_dir
     }
     
-    with open(os.path.join(output_dir, "task_info.json"), "w") as f:
-        json.dump(info, f, indent=2)
-    
     # Handle data files - check for common data files in current directory
     common_data_files = ['betas.arrow', 'metadata.arrow']
     current_dir = os.getcwd()
@@ -1076,12 +1672,24 @@ def setup_task_environment(stage, subtask=None, is_restart=False, workdir_suffix
     # Track the found files and their locations
     data_files_info = {}
     
-    # Check current directory for data files
+    # Index the data files present in the current directory with a single scan
+    wanted = set(common_data_files)
+    with os.scandir(current_dir) as entries:
+        present = {entry.name: entry.path for entry in entries if entry.name in wanted}
+        
+    # Identify the input data by size and modification time; hashing the
+    # (multi-GB) file contents would cost more than the stage setup itself
+    input_stats = []
+    for filename in sorted(present):
+        stat = os.stat(present[filename])
+        input_stats.append([filename, stat.st_size, stat.st_mtime_ns])
+    inputs_digest = hashlib.sha256(json.dumps(input_stats).encode()).hexdigest()
+    
     for filename in common_data_files:
-        if os.path.exists(os.path.join(current_dir, filename)):
+        if filename in present:
             data_files_info[filename] = {
                 "location": "current_dir",
-                "path": os.path.join(current_dir, filename),
+                "path": present[filename],
                 "relative_path": filename
             }
         else:
@@ -1093,29 +1701,247 @@ def setup_task_environment(stage, subtask=None, is_restart=False, workdir_suffix
     # Add data files info to the environment details
     info["data_files"] = data_files_info
     info["docker_working_directory"] = current_dir
+    info["inputs_digest"] = inputs_digest
     
-    # Update the info file with data files information
-    with open(os.path.join(output_dir, "task_info.json"), "w") as f:
-        json.dump(info, f, indent=2)
+    # When resuming with unchanged inputs, keep the existing info file instead of rewriting it
+    info_file = os.path.join(output_dir, "task_info.json")
+    previous_info = None
+    if not is_restart and os.path.exists(info_file):
+        try:
+            previous_info = read_json(info_file)
+        except (OSError, json.JSONDecodeError):
+            previous_info = None
+    
+    if previous_info is not None and {**previous_info, "timestamp": info["timestamp"]} == info:
+        info = previous_info
+    else:
+        # Write the complete info file once, so readers never see a partial version.
+        # It is only read back by this function, so it is written compactly.
+        write_json_atomic(info_file, info)
     
     return {
         "workdir": current_dir,            # The Docker container working directory
         "output_dir": output_dir,          # Where to save outputs
         "info": info,
-        "data_files": data_files_info
+        "data_files": data_files_info,
+        "inputs_digest": inputs_digest     # Changes whenever an input data file changes
     }
 
+def task_env_fingerprint(task_env):
+    """Hash the inputs a task environment carries, ignoring per-run details like timestamps.
+    
+    Args:
+        task_env: Task environment returned by setup_task_environment
+        
+    Returns:
+        str: Hex digest identifying the environment's inputs
+    """
+    payload = {
+        "workdir": task_env["workdir"],
+        "output_dir": task_env["output_dir"],
+        "data_files": task_env["data_files"],
+        "inputs_digest": task_env.get("inputs_digest"),
+        "tasks": load_task_prompts(),
+        "agents": load_agent_configs()
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def _cache_key(**fields):
+    """Hash JSON-serializable fields into a cache key."""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+def _load_cached_result(cache_file):
+    """Load a pickled result, or return None if it is missing or unreadable."""
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load cached result {cache_file}: {e}")
+        return None
+
+def _store_cached_result(cache_file, result):
+    """Pickle a result atomically; failures only print a warning."""
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_path = f"{cache_file}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(tmp_path, cache_file)
+    except Exception as e:
+        print(f"Warning: Could not cache result {cache_file}: {e}")
+
+def _subtask_summaries(stage, subtask, before_iteration=None):
+    """Read a subtask's structured summaries without their timestamps.
+    
+    Args:
+        stage: Stage number
+        subtask: Subtask number
+        before_iteration: Optional iteration number; only earlier iterations are returned
+        
+    Returns:
+        dict: iteration number -> {"task_description", "summary"}
+    """
+    try:
+        summaries = read_json(os.path.join(memory_dir, 'structured_summaries.json'))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    entries = {}
+    for iter_key, entry in summaries.get(f"stage{stage}", {}).get(f"subtask{subtask}", {}).items():
+        iteration = int(iter_key.replace("iteration", ""))
+        if before_iteration is None or iteration < before_iteration:
+            entries[iteration] = {"task_description": entry.get("task_description"),
+                                  "summary": entry.get("summary")}
+    return entries
+
+def directory_manifest(directory):
+    """List a directory tree's files with their sizes and modification times.
+    
+    A cheap stand-in for hashing file contents: any rewritten file changes its
+    entry. Missing directories give an empty manifest.
+    
+    Args:
+        directory: Directory to list
+        
+    Returns:
+        list: Sorted [relative path, size, mtime_ns] entries
+    """
+    manifest = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            manifest.append([os.path.relpath(path, directory), stat.st_size, stat.st_mtime_ns])
+    manifest.sort()
+    return manifest
+
+def memoize_to_disk(stage, subtask, cache_dir=None, upstream_stages=()):
+    """Cache a subtask runner's result on disk so a resumed workflow can skip it.
+    
+    The wrapped coroutine must take (iteration, task_env, ...) like run_subtask_2.
+    Results are keyed on stage, subtask, iteration, task_env_fingerprint(), the
+    stage's subtask 1 plan, the summaries of this subtask's earlier iterations and
+    the manifests of the upstream stages' work directories, so re-running an
+    earlier stage or re-planning invalidates the cache. Cached results are only
+    reused when resuming (task_env was set up without is_restart). A hit restores
+    the run's structured summary and workflow state; the message transcripts and
+    output files the original run left behind are kept as-is.
+    
+    Args:
+        stage: Stage number of the subtask
+        subtask: Subtask number
+        cache_dir: Optional cache directory, defaults to <memory_dir>/subtask_cache
+        upstream_stages: Stage numbers whose task_<n>_workdir outputs the subtask reads
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(iteration=1, task_env=None, *args, **kwargs):
+            if task_env is None:
+                return await func(iteration, task_env, *args, **kwargs)
+            
+            upstream = {n: directory_manifest(get_task_workdir_name(n)) for n in upstream_stages}
+            key = _cache_key(stage=stage, subtask=subtask, iteration=iteration,
+                             env=task_env_fingerprint(task_env), upstream=upstream,
+                             plan=_subtask_summaries(stage, 1),
+                             previous=_subtask_summaries(stage, subtask, before_iteration=iteration))
+            directory = cache_dir or os.path.join(memory_dir, 'subtask_cache')
+            cache_file = os.path.join(directory, f"{key}.pkl")
+            
+            if not task_env["info"].get("is_restart"):
+                cached = _load_cached_result(cache_file)
+                if cached is not None:
+                    print(f"Using cached result for stage {stage}, subtask {subtask}, iteration {iteration}")
+                    entry = cached["summary"]
+                    if entry is not None:
+                        # Also updates the workflow state
+                        await save_structured_summary(stage, subtask, iteration,
+                                                      entry["summary"], entry["task_description"])
+                    else:
+                        update_workflow_state(stage, subtask, iteration)
+                    return cached["result"]
+            
+            result = await func(iteration, task_env, *args, **kwargs)
+            
+            if result is not None:
+                entry = _subtask_summaries(stage, subtask).get(iteration)
+                _store_cached_result(cache_file, {"result": result, "summary": entry})
+            return result
+        return wrapper
+    return decorator
+
+# Set ALTUM_PLAN_CACHE=1 to reuse subtask 1 discussions whose prompt hasn't changed
+PLAN_CACHE_ENV = "ALTUM_PLAN_CACHE"
+
+async def run_cached_discussion(stage, subtask, formatted_task, run_discussion, task_env=None):
+    """Run a planning discussion, reusing the result of an identical earlier one.
+    
+    Only active when the ALTUM_PLAN_CACHE environment variable is "1". Results
+    are keyed on the formatted prompt (which includes the previous stages'
+    summaries), the agent configs and the input data digest, so the cache also
+    applies to restarts. The caller still saves the messages as usual.
+    
+    Args:
+        stage: Stage number of the discussion
+        subtask: Subtask number
+        formatted_task: The full prompt given to the discussion
+        run_discussion: Zero-argument callable returning the discussion coroutine
+        task_env: Optional task environment, for its input data digest
+        
+    Returns:
+        The discussion result
+    """
+    if os.environ.get(PLAN_CACHE_ENV) != "1":
+        return await run_discussion()
+    
+    key = _cache_key(stage=stage, subtask=subtask, task=formatted_task,
+                     agents=load_agent_configs(),
+                     inputs_digest=task_env.get("inputs_digest") if task_env else None)
+    cache_file = os.path.join(memory_dir, 'plan_cache', f"{key}.pkl")
+    
+    result = _load_cached_result(cache_file)
+    if result is not None:
+        print(f"Using cached discussion for stage {stage}, subtask {subtask}")
+        return result
+    
+    result = await run_discussion()
+    if result is not None:
+        _store_cached_result(cache_file, result)
+    return result
+
 # Task prompt loading utilities
+@functools.lru_cache(maxsize=4)
+def _load_task_prompts_cached(config_path, mtime):
+    """Parse the task YAML. Keyed on mtime so edits to the file are picked up."""
+    with open(config_path, "r") as f:
+        prompts = yaml.safe_load(f)
+    return prompts.get("tasks", {})
+
 def load_task_prompts(config_path=None):
-    """Load task prompts from YAML file."""
+    """Load task prompts from YAML file.
+    
+    Like load_agent_configs, the parsed prompts are cached per (path, mtime).
+    """
     if config_path is None:
         # Use path relative to current file
         config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
                                   "config/tasks.yaml")
     
-    with open(config_path, "r") as f:
-        prompts = yaml.safe_load(f)
-    return prompts.get("tasks", {})
+    return _load_task_prompts_cached(config_path, os.path.getmtime(config_path))
+
+# Expose cache invalidation for explicit restarts
+load_task_prompts.cache_clear = _load_task_prompts_cached.cache_clear
+
+# {name} placeholders in task prompts; other braces (e.g. JSON examples) are literal text
+_TASK_PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_]\w*)\}")
+
+@functools.lru_cache(maxsize=64)
+def _parse_task_template(task_text):
+    """Split a task prompt into alternating literal text and placeholder names, once per prompt."""
+    return tuple(_TASK_PLACEHOLDER_RE.split(task_text))
 
 def get_task_text(task_category, task_name, **kwargs):
     """Get a task prompt text with optional format parameters.
@@ -1149,7 +1975,11 @@ def get_task_text(task_category, task_name, **kwargs):
     
     if kwargs:
         try:
-            task_text = task_text.format(**kwargs)
+            # Only the substitution happens per call; the template was parsed once.
+            # Odd positions hold placeholder names, even positions the literal text between them.
+            parts = list(_parse_task_template(task_text))
+            parts[1::2] = [format(kwargs[name]) for name in parts[1::2]]
+            task_text = "".join(parts)
         except KeyError as e:
             print(f"Warning: Missing format parameter: {e}")
     
@@ -1164,18 +1994,14 @@ def get_system_prompt(prompt_name):
     Returns:
         str: The agent's system prompt text
     """
-    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                              "config/agents.yaml")
-    
-    with open(config_path, "r") as f:
-        agents_config = yaml.safe_load(f)
+    agent_configs = load_agent_configs()
     
-    if "agents" not in agents_config:
+    if not agent_configs:
         print(f"Warning: No agents found in agents.yaml")
         return ""
     
     # Find the agent with the matching name
-    for agent in agents_config["agents"]:
+    for agent in agent_configs:
         if agent["name"] == prompt_name:
             return agent.get("system_prompt", "")
     
@@ -1191,11 +2017,8 @@ def get_checklist(checklist_name):
     Returns:
         str: The checklist text
     """
-    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                              "config/tasks.yaml")
-    
-    with open(config_path, "r") as f:
-        prompts = yaml.safe_load(f)
+    # Checklists are nested under the tasks section of tasks.yaml
+    prompts = load_task_prompts()
     
     if "checklists" not in prompts or checklist_name not in prompts["checklists"]:
         print(f"Warning: Checklist '{checklist_name}' not found in tasks.yaml")
@@ -1203,6 +2026,36 @@ def get_checklist(checklist_name):
     
     return prompts["checklists"][checklist_name]
 
+@functools.lru_cache(maxsize=None)
+def _write_checklist_source(checklist_name, directory):
+    """Write a checklist to the memory directory once per process and return its path."""
+    path = os.path.join(directory, "checklists", f"{checklist_name}_checklist.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(get_checklist(checklist_name))
+    return path
+
+def install_checklist(checklist_name, dest_dir):
+    """Place a checklist file (e.g. plot_quality_checklist.txt) in a task directory.
+    
+    The checklist is written once per process and copied into each task
+    directory, so code run in one directory cannot edit another's copy.
+    
+    Args:
+        checklist_name: Name of the checklist (e.g., 'plot_quality')
+        dest_dir: Directory to place the checklist file in
+        
+    Returns:
+        str: Path to the installed checklist file
+    """
+    source = _write_checklist_source(checklist_name, memory_dir)
+    dest = os.path.join(dest_dir, os.path.basename(source))
+    tmp_path = f"{dest}.tmp.{os.getpid()}"
+    shutil.copyfile(source, tmp_path)
+    # Replace rather than copy directly so a stale copy from an earlier run is overwritten
+    os.replace(tmp_path, dest)
+    return dest
+
 def get_agent_token(agent_configs, agent_name, token_type="termination_token"):
     """Get a token for an agent from the agent configs.
     